@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Prints query plans and latencies of the REST API's typical queries, e.g.
+before and after running db_migrate_indexes.sh. Parameters are taken from
+the most recent meter record (unless given), the time range defaults to
+the last --days days.
+
+Usage: db_benchmark_queries.sh [--runs N] [--days N] [--limit N]
+                               [--host ID] [--meter ID] [--resource UUID]
+                               [--project UUID] [--user ID]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from datetime import timedelta
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(
+        sys.argv[0]), os.pardir, os.pardir))
+
+if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
+    sys.path.append(possible_topdir)
+
+from sqlalchemy import text
+from giraffe.common.config import Config
+import giraffe.service.db as db
+
+RECORDS = 'SELECT * FROM meter_record ' \
+          'WHERE %s = :dim AND meter_id = :meter_id ' \
+          'AND meter_timestamp BETWEEN :start AND :end ' \
+          'ORDER BY meter_timestamp DESC LIMIT :limit'
+
+QUERIES = [('host records', RECORDS % 'host_id'),
+           ('resource records', RECORDS % 'resource_id'),
+           ('project records', RECORDS % 'project_id'),
+           ('user records', RECORDS % 'user_id'),
+           ('host meters', 'SELECT DISTINCT meter_id FROM meter_record '
+                           'WHERE host_id = :host_id'),
+           ('project instances', 'SELECT DISTINCT resource_id '
+                                 'FROM meter_record '
+                                 'WHERE project_id = :project_id '
+                                 'AND meter_timestamp '
+                                 'BETWEEN :start AND :end'),
+           ('host by name', 'SELECT * FROM host WHERE host_name = :host_name'),
+           ('meter by name', 'SELECT * FROM meter '
+                             'WHERE meter_name = :meter_name')]
+
+parser = ArgumentParser(description='Benchmark Giraffe REST API queries.')
+parser.add_argument('--runs', action='store', type=int, default=10)
+parser.add_argument('--days', action='store', type=int, default=7)
+parser.add_argument('--limit', action='store', type=int, default=100)
+parser.add_argument('--host', action='store', type=int, default=None)
+parser.add_argument('--meter', action='store', type=int, default=None)
+parser.add_argument('--resource', action='store', default=None)
+parser.add_argument('--project', action='store', default=None)
+parser.add_argument('--user', action='store', default=None)
+args = parser.parse_args()
+
+print 'Loading configuration.........',
+config = Config("giraffe.cfg")
+print '\tdone'
+
+print 'Connecting to database........',
+db = db.connect('%s://%s:%s@%s/%s' % (config.get('db', 'vendor'),
+                                      config.get('db', 'user'),
+                                      config.get('db', 'pass'),
+                                      config.get('db', 'host'),
+                                      config.get('db', 'schema')))
+engine = db._engine
+print '\tdone'
+
+latest = engine.execute('SELECT * FROM meter_record '
+                        'WHERE resource_id IS NOT NULL '
+                        'ORDER BY id DESC LIMIT 1').first()
+if latest is None:
+    print '\nNo meter records - nothing to benchmark.'
+    sys.exit(1)
+
+params = dict(host_id=args.host or latest['host_id'],
+              meter_id=args.meter or latest['meter_id'],
+              resource_id=args.resource or latest['resource_id'],
+              project_id=args.project or latest['project_id'],
+              user_id=args.user or latest['user_id'],
+              end=latest['meter_timestamp'],
+              start=latest['meter_timestamp'] - timedelta(days=args.days),
+              limit=args.limit)
+params['host_name'] = engine.execute(text('SELECT host_name FROM host '
+                                          'WHERE id = :host_id'),
+                                     **params).scalar()
+params['meter_name'] = engine.execute(text('SELECT meter_name FROM meter '
+                                           'WHERE id = :meter_id'),
+                                      **params).scalar()
+
+print '\n%-18s %-34s %10s %10s %10s' % ('query', 'index', 'rows',
+                                        'median ms', 'max ms')
+for name, sql in QUERIES:
+    query_params = dict(params)
+    if ':dim' in sql:
+        query_params['dim'] = params[name.split()[0] + '_id']
+
+    plan = engine.execute(text('EXPLAIN ' + sql), **query_params).first()
+    latencies = []
+    for _ in range(args.runs):
+        started = time.time()
+        engine.execute(text(sql), **query_params).fetchall()
+        latencies.append((time.time() - started) * 1000)
+    latencies.sort()
+
+    print '%-18s %-34s %10s %10.2f %10.2f' % (name, plan['key'] or '-',
+                                              plan['rows'],
+                                              latencies[len(latencies) / 2],
+                                              latencies[-1])
+    if plan['Extra']:
+        print '%-18s %s' % ('', plan['Extra'])
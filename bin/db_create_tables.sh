@@ -18,6 +18,7 @@ if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
 from giraffe.common.config import Config
 import giraffe.service.db as db
 from giraffe.service.db import Base
+from giraffe.service.partitions import PartitionManager
 
 print 'Loading configuration.........',
 config = Config("giraffe.cfg")
@@ -35,4 +36,11 @@ print 'Creating tables...............',
 Base.metadata.create_all(db._engine)
 print '\tdone'
 
+print 'Partitioning tables...........',
+PartitionManager(db._engine,
+                 months=int(config.get('db', 'partition_months', default=1)),
+                 ahead=int(config.get('db', 'partition_ahead', default=3)),
+                 retention=0).maintain()
+print '\tdone'
+
 print '\nAll done - tables successfully created!'
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Maintains the partitions of the meter_record table: partitions the table
+(on first run), pre-creates the partitions of the next periods and drops
+expired ones. Meant to be run regularly, e.g. daily by cron.
+
+Configuration ([db] section of giraffe.cfg, overridden by the options):
+    partition_months     length of a partition's period in months (1)
+    partition_ahead      number of periods to create in advance (3)
+    partition_retention  number of months to keep, 0: keep everything (0)
+
+Usage: db_maintain_partitions.sh [--months N] [--ahead N] [--retention N]
+                                 [--dry-run]
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(
+        sys.argv[0]), os.pardir, os.pardir))
+
+if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
+    sys.path.append(possible_topdir)
+
+from giraffe.common.config import Config
+import giraffe.service.db as db
+from giraffe.service.partitions import PartitionManager, partition_plan
+
+print 'Loading configuration.........',
+config = Config("giraffe.cfg")
+print '\tdone'
+
+parser = ArgumentParser(description='Maintain Giraffe table partitions.')
+parser.add_argument('--months', action='store', type=int,
+                    default=int(config.get('db', 'partition_months',
+                                           default=1)))
+parser.add_argument('--ahead', action='store', type=int,
+                    default=int(config.get('db', 'partition_ahead',
+                                           default=3)))
+parser.add_argument('--retention', action='store', type=int,
+                    default=int(config.get('db', 'partition_retention',
+                                           default=0)))
+parser.add_argument('--dry-run', action='store_true', default=False,
+                    help='print the partitions to create and drop only')
+args = parser.parse_args()
+
+print 'Connecting to database........',
+db = db.connect('%s://%s:%s@%s/%s' % (config.get('db', 'vendor'),
+                                      config.get('db', 'user'),
+                                      config.get('db', 'pass'),
+                                      config.get('db', 'host'),
+                                      config.get('db', 'schema')))
+manager = PartitionManager(db._engine, months=args.months, ahead=args.ahead,
+                           retention=args.retention)
+print '\tdone'
+
+if args.dry_run:
+    create, drop = partition_plan(manager.partitions(), datetime.now(),
+                                  args.months, args.ahead, args.retention)
+else:
+    print 'Maintaining partitions........',
+    create, drop = manager.maintain()
+    print '\tdone'
+
+for name, upper in create:
+    print '  + %s (< %s)' % (name, upper)
+for name in drop:
+    print '  - %s' % name
+
+print '\nAll done - %d partitions created, %d dropped!' % (len(create),
+                                                           len(drop))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+Creates the user, instance and meter_presence tables for existing
+installations (db_create_tables.sh creates them for new ones), and fills
+them from the meter_record table - once, i.e. this scans meter_record; the
+collector keeps them up to date afterwards. Re-running the script is safe.
+
+Earlier versions of db.py defined an instance table that was never written
+to; if it exists (and is empty), it is re-created.
+
+Usage: db_migrate_dimensions.sh
+"""
+
+import os
+import sys
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(
+        sys.argv[0]), os.pardir, os.pardir))
+
+if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
+    sys.path.append(possible_topdir)
+
+from giraffe.common.config import Config
+import giraffe.service.db as db
+from giraffe.service.db import User, Instance, MeterPresence
+
+SEEN = 'MIN(meter_timestamp), MAX(meter_timestamp)'
+ON_DUPLICATE_KEY = ('ON DUPLICATE KEY UPDATE '
+                    'first_seen = LEAST(first_seen, VALUES(first_seen)), '
+                    'last_seen = GREATEST(last_seen, VALUES(last_seen))')
+
+BACKFILLS = [
+    ('user',
+     'INSERT INTO user (uuid, first_seen, last_seen) '
+     'SELECT user_id, %s FROM meter_record '
+     'WHERE user_id IS NOT NULL GROUP BY user_id %s'),
+    ('instance',
+     'INSERT INTO instance (uuid, project_id, user_id, host_id, '
+     '                      first_seen, last_seen) '
+     'SELECT resource_id, MAX(project_id), MAX(user_id), MAX(host_id), %s '
+     'FROM meter_record '
+     'WHERE resource_id IS NOT NULL GROUP BY resource_id %s')]
+for entity, column in (('host', 'host_id'), ('project', 'project_id'),
+                       ('user', 'user_id'), ('instance', 'resource_id')):
+    BACKFILLS.append(
+        ('meter_presence (%s)' % entity,
+         "INSERT INTO meter_presence (entity, entity_id, meter_id, "
+         "                            first_seen, last_seen) "
+         "SELECT '" + entity + "', " + column + ", meter_id, %s "
+         "FROM meter_record WHERE " + column + " IS NOT NULL "
+         "GROUP BY " + column + ", meter_id %s"))
+
+print 'Loading configuration.........',
+config = Config("giraffe.cfg")
+print '\tdone'
+
+print 'Connecting to database........',
+db = db.connect('%s://%s:%s@%s/%s' % (config.get('db', 'vendor'),
+                                      config.get('db', 'user'),
+                                      config.get('db', 'pass'),
+                                      config.get('db', 'host'),
+                                      config.get('db', 'schema')))
+engine = db._engine
+print '\tdone'
+
+columns = [row[0] for row in engine.execute(
+    "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'instance'")]
+if columns and 'first_seen' not in columns:
+    print 'Dropping old instance table...',
+    if engine.execute('SELECT COUNT(*) FROM instance').scalar():
+        print '\tfailed'
+        sys.exit('Table instance is not empty; please drop it manually.')
+    Instance.__table__.drop(engine)
+    print '\tdone'
+
+print 'Creating tables...............',
+for cls in (User, Instance, MeterPresence):
+    cls.__table__.create(engine, checkfirst=True)
+print '\tdone'
+
+for name, statement in BACKFILLS:
+    print 'Filling %s...' % name,
+    result = engine.execute(statement % (SEEN, ON_DUPLICATE_KEY))
+    print '\t%d rows' % result.rowcount
+
+print '\nAll done - dimension tables successfully filled!'
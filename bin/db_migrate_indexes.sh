@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Creates the composite indexes of the meter_record, host and meter tables
+for existing installations (db_create_tables.sh creates them for new ones),
+and drops the single-column indexes they supersede if --drop-redundant is
+given. InnoDB builds secondary indexes online, i.e. the collector can keep
+writing while the migration is running. Re-running the script is safe.
+
+Usage: db_migrate_indexes.sh [--drop-redundant]
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(
+        sys.argv[0]), os.pardir, os.pardir))
+
+if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
+    sys.path.append(possible_topdir)
+
+from giraffe.common.config import Config
+import giraffe.service.db as db
+from giraffe.service.db import Host, Meter, MeterRecord
+
+# single-column indexes created by earlier versions of db.py; all of them
+# are prefixes of one of the composite indexes
+REDUNDANT_INDEXES = {'meter_record': ['ix_meter_record_user_id',
+                                      'ix_meter_record_resource_id',
+                                      'ix_meter_record_project_id']}
+
+parser = ArgumentParser(description='Migrate Giraffe table indexes.')
+parser.add_argument('--drop-redundant', action='store_true', default=False,
+                    help='drop single-column indexes superseded by the '
+                         'composite ones')
+args = parser.parse_args()
+
+print 'Loading configuration.........',
+config = Config("giraffe.cfg")
+print '\tdone'
+
+print 'Connecting to database........',
+db = db.connect('%s://%s:%s@%s/%s' % (config.get('db', 'vendor'),
+                                      config.get('db', 'user'),
+                                      config.get('db', 'pass'),
+                                      config.get('db', 'host'),
+                                      config.get('db', 'schema')))
+engine = db._engine
+print '\tdone'
+
+
+def existing_indexes(table_name):
+    return set(row[2] for row in engine.execute('SHOW INDEX FROM %s'
+                                                % table_name))
+
+created = 0
+for table in (Meter.__table__, Host.__table__, MeterRecord.__table__):
+    existing = existing_indexes(table.name)
+    for index in sorted(table.indexes, key=lambda i: i.name):
+        print 'Creating %s...' % index.name,
+        if index.name in existing:
+            print '\texists'
+            continue
+        index.create(engine)
+        created += 1
+        print '\tdone'
+
+dropped = 0
+if args.drop_redundant:
+    for table_name, index_names in REDUNDANT_INDEXES.items():
+        existing = existing_indexes(table_name)
+        for index_name in index_names:
+            if index_name in existing:
+                print 'Dropping %s...' % index_name,
+                engine.execute('DROP INDEX %s ON %s'
+                               % (index_name, table_name))
+                dropped += 1
+                print '\tdone'
+
+print '\nAll done - %d indexes created, %d dropped!' % (created, dropped)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Adds the numeric value column (meter_value_num) to the meter_record table,
+if missing, and backfills it from meter_value for existing records.
+
+The column is added online (ALGORITHM=INPLACE, LOCK=NONE) where the MySQL
+server supports it; the backfill runs in small id ranges, each committed on
+its own, s.t. the collector can keep writing while the migration is running.
+Re-running the script is safe - it only touches records not migrated yet.
+
+Usage: db_migrate_numeric_values.sh [--chunk-size N] [--pause SECONDS]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(
+        sys.argv[0]), os.pardir, os.pardir))
+
+if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
+    sys.path.append(possible_topdir)
+
+from sqlalchemy import text
+from giraffe.common.config import Config
+import giraffe.service.db as db
+
+parser = ArgumentParser(description='Migrate Giraffe meter record values.')
+parser.add_argument('--chunk-size', action='store', type=int, default=10000,
+                    help='number of record ids per UPDATE, default: 10000')
+parser.add_argument('--pause', action='store', type=float, default=0.1,
+                    help='seconds to sleep between chunks, default: 0.1')
+args = parser.parse_args()
+
+print 'Loading configuration.........',
+config = Config("giraffe.cfg")
+print '\tdone'
+
+print 'Connecting to database........',
+db = db.connect('%s://%s:%s@%s/%s' % (config.get('db', 'vendor'),
+                                      config.get('db', 'user'),
+                                      config.get('db', 'pass'),
+                                      config.get('db', 'host'),
+                                      config.get('db', 'schema')))
+engine = db._engine
+print '\tdone'
+
+print 'Adding column.................',
+columns = [row[0] for row in engine.execute('SHOW COLUMNS FROM meter_record')]
+if 'meter_value_num' in columns:
+    print '\texists'
+else:
+    alter = 'ALTER TABLE meter_record ' \
+            'ADD COLUMN meter_value_num DOUBLE NULL DEFAULT NULL ' \
+            'AFTER meter_value'
+    try:
+        engine.execute(alter + ', ALGORITHM=INPLACE, LOCK=NONE')
+    except Exception:
+        # older servers: no online DDL (table gets locked while altering)
+        engine.execute(alter)
+    print '\tdone'
+
+lo, hi = engine.execute('SELECT MIN(id), MAX(id) FROM meter_record').first()
+backfill = text("UPDATE meter_record "
+                "SET meter_value_num = meter_value + 0 "
+                "WHERE id BETWEEN :lo AND :hi "
+                "AND meter_value_num IS NULL "
+                "AND meter_value REGEXP "
+                "'^[-+]?[0-9]*\\\\.?[0-9]+([eE][-+]?[0-9]+)?$'")
+
+migrated = 0
+while lo is not None and lo <= hi:
+    print 'Migrating ids %d-%d...' % (lo, lo + args.chunk_size - 1),
+    result = engine.execute(backfill.execution_options(autocommit=True),
+                            lo=lo, hi=lo + args.chunk_size - 1)
+    print '\t%d records' % result.rowcount
+    migrated += result.rowcount
+    lo += args.chunk_size
+    time.sleep(args.pause)
+
+print '\nAll done - %d records successfully migrated!' % migrated
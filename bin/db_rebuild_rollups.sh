@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""
+(Re-)builds the hourly and daily rollup tables from raw meter records, one
+day at a time - e.g., for records collected before rollups were introduced.
+Rollups of the given days are replaced; since the collector updates rollups
+of the current day, do not rebuild days the collector is still writing to.
+
+Usage: db_rebuild_rollups.sh [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(
+        sys.argv[0]), os.pardir, os.pardir))
+
+if os.path.exists(os.path.join(possible_topdir, "giraffe", "__init__.py")):
+    sys.path.append(possible_topdir)
+
+from giraffe.common.config import Config
+import giraffe.service.db as db
+from giraffe.service.db import MeterRecord, HourlyRollup, DailyRollup
+
+parser = ArgumentParser(description='Rebuild Giraffe rollup tables.')
+parser.add_argument('--start', action='store', default=None,
+                    help='first day (YYYY-MM-DD), default: oldest record')
+parser.add_argument('--end', action='store', default=None,
+                    help='last day (YYYY-MM-DD), default: yesterday')
+args = parser.parse_args()
+
+print 'Loading configuration.........',
+config = Config("giraffe.cfg")
+print '\tdone'
+
+print 'Connecting to database........',
+db = db.connect('%s://%s:%s@%s/%s' % (config.get('db', 'vendor'),
+                                      config.get('db', 'user'),
+                                      config.get('db', 'pass'),
+                                      config.get('db', 'host'),
+                                      config.get('db', 'schema')))
+db.session_open()
+print '\tdone'
+
+dt_format = '%Y-%m-%d %H:%M:%S'
+if args.start:
+    day = datetime.strptime(args.start, '%Y-%m-%d')
+else:
+    oldest = db.min(MeterRecord, 'timestamp')
+    day = datetime(oldest.year, oldest.month, oldest.day) if oldest \
+          else datetime.now()
+if args.end:
+    end = datetime.strptime(args.end, '%Y-%m-%d')
+else:
+    end = datetime.now() - timedelta(days=1)
+
+days = 0
+while day <= end:
+    print 'Rebuilding %s.............' % day.strftime('%Y-%m-%d'),
+    window = (day.strftime(dt_format),
+              (day + timedelta(days=1, seconds=-1)).strftime(dt_format))
+    records = [dict(meter_id=r.meter_id,
+                    host_id=r.host_id,
+                    resource_id=r.resource_id,
+                    project_id=r.project_id,
+                    value=r.value,
+                    timestamp=r.timestamp)
+               for r in db.load(MeterRecord, {'timestamp': window})]
+    for rollup_cls in (HourlyRollup, DailyRollup):
+        db.delete_all(rollup_cls, {'bucket': window})
+        db.merge_rollups(rollup_cls, rollup_cls.aggregate(records))
+    db.commit()
+    print '\t%d records' % len(records)
+    day += timedelta(days=1)
+    days += 1
+
+db.session_close()
+print '\nAll done - rollups of %d days successfully rebuilt!' % days
@@ -3,7 +3,20 @@
 """
 Starts a Giraffe service with "giraffe.cfg" configuration file.
 
-Dependencies: sqlalchemy, flask, MySQL-python
+The REST API is served by gunicorn if "workers" is set in the [rest_api]
+section, e.g.:
+    [rest_api]
+    workers = 8             ; worker processes, e.g. 2 per core
+    threads = 4             ; threads per worker process
+    keepalive = 5           ; seconds
+    timeout = 60            ; seconds until silent workers are restarted
+    graceful_timeout = 30   ; seconds, on reload (SIGHUP) and shutdown
+    max_requests = 0        ; requests until a worker is restarted
+    metrics_dir = /var/run/giraffe-metrics  ; workers' metrics (default: a
+                                            ; temporary directory)
+and by the (Flask) development server otherwise.
+
+Dependencies: sqlalchemy, flask, MySQL-python (gunicorn)
 """
 
 import os
@@ -42,5 +55,10 @@ if __name__ == '__main__':
     try:
         service = Rest_API()
         service.launch()
-    except (Exception, SystemExit):
+    except SystemExit as e:
+        # gunicorn's arbiter exits w/ code 0 on shutdown (e.g., SIGTERM)
+        if e.code:
+            logger.error('Service exited with status %s' % e.code)
+        raise
+    except Exception:
         logger.exception(('Failed to load %s') % 'Service')
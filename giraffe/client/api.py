@@ -20,6 +20,17 @@ Usage:
     or
     hosts = gc.get_hosts().as_(Host)
     > (list of Host objects)
+    records = gc.get_host_meter_records(<host>, <meter>,
+                                        params={'format': 'ndjson'})
+    > (generator of dicts, yielded while the response is received)
+    series = gc.get_host_meter_records(<host>, <meter>,
+                                       params={'format': 'packed'})
+    > {'meta': {'host_id': .., ..}, 'timestamps': [..], 'values': [..]}
+      (same for format "columnar", i.e. JSON-formatted)
+    series = gc.get_host_meter_records(<host>, <meter>,
+                                       params={'interval': '1h',
+                                               'stats': 'avg,max'})
+    > {'interval': 3600, 'timestamps': [..], 'avg': [..], 'max': [..]}
     etc.
 
 Additional remarks:
@@ -28,8 +39,11 @@ Additional remarks:
     requests.exceptions.HTTPError.
 """
 
+import json
+import struct
 import requests  # < requests 0.14.2
 
+from giraffe.common.cache import Cache
 from giraffe.common.config import Config
 from giraffe.common.url_builder import URLBuilder
 from giraffe.common.auth import AuthProxy
@@ -98,6 +112,16 @@ class GiraffeClient(object):
             port = kwargs.get('port', self.config.get('rest_api', 'port'))
             self.endpoint = ':'.join((host, port))
 
+        # records routes are fetched page by page, see _get_pages()
+        self.page_size = int(kwargs.get('page_size', 1000))
+
+        # URL -> (ETag, response body) of recent requests, s.t. repeated
+        # requests are revalidated (If-None-Match) instead of re-downloaded;
+        # bodies larger than validators_max_bytes are not kept
+        self._validators = Cache(int(kwargs.get('validators_size', 100)))
+        self.validators_max_bytes = int(kwargs.get('validators_max_bytes',
+                                                   262144))
+
     @property
     def auth_token(self):
         return self.auth_header['X-Auth-Token']
@@ -106,7 +130,7 @@ class GiraffeClient(object):
     def auth_token(self, auth_token):
         self.auth_header['X-Auth-Token'] = auth_token
 
-    def _get(self, path, params=None):
+    def _get(self, path, params=None, paginate=False):
         # ---------------------------------------------------------------------
         class ResultSet(tuple):
 
@@ -143,16 +167,96 @@ class GiraffeClient(object):
                 return tuple(formatter.serialize(elem, catalog) for elem in self)
         # end of class _ResultSet ---------------------------------------------
 
+        response_format = params.get('format') if params else None
+        if response_format == 'ndjson':
+            return self._iter_lines(path, params)
+        elif response_format == 'columnar':
+            return self._request(path, params)
+        elif response_format == 'packed':
+            return self._unpack(self._request(path, params, raw=True))
+        elif params and (params.get('interval') or params.get('stats')):
+            # time series, i.e. a dict of parallel arrays (not paged)
+            return self._request(path, params)
+        elif paginate and not (params and (params.get('aggregation') or
+                                           params.get('cursor'))):
+            result = self._get_pages(path, params)
+        else:
+            result = self._request(path, params)
+
+        return ResultSet(result, giraffe_client=self) \
+                   if isinstance(result, (tuple, list, dict)) \
+                   else result
+        # ...was:  else response.text
+
+    def _request(self, path, params=None, raw=False):
         url = URLBuilder.build(self.protocol, self.endpoint, path, params)
         logger.debug('Query: %s' % url)
-        response = requests.get(url, headers=self.auth_header)
+        headers = self.auth_header
+        validated = self._validators.get(url)
+        if validated:
+            headers = dict(headers, **{'If-None-Match': validated[0]})
+        response = requests.get(url, headers=headers)
         logger.debug('HTTP response status code: %s' % response.status_code)
+        if response.status_code == 304 and validated:
+            return validated[1] if raw else json.loads(validated[1])
         response.raise_for_status()
+        if response.headers.get('etag') \
+           and len(response.content) <= self.validators_max_bytes:
+            self._validators.set(url, (response.headers['etag'],
+                                       response.content))
+        return response.content if raw else response.json
 
-        return ResultSet(response.json, giraffe_client=self) \
-                   if isinstance(response.json, (tuple, list, dict)) \
-                   else response.json
-        # ...was:  else response.text
+    def _unpack(self, content):
+        """
+        Decodes a response of format "packed" - i.e., a JSON-formatted header
+        line followed by "count" little-endian 64-bit timestamps and doubles
+        - into a dict of format "columnar" (NaN values are returned as None).
+        """
+        header, _, arrays = content.partition('\n')
+        result = json.loads(header)
+        count = result.pop('count')
+        result['timestamps'] = list(struct.unpack_from('<%dq' % count,
+                                                       arrays))
+        result['values'] = [v if v == v else None
+                            for v in struct.unpack_from('<%dd' % count,
+                                                        arrays, 8 * count)]
+        return result
+
+    def _iter_lines(self, path, params=None):
+        """
+        Yields the objects of a streamed response (query param
+        "format=ndjson") one by one, while the response is received.
+        """
+        url = URLBuilder.build(self.protocol, self.endpoint, path, params)
+        logger.debug('Query: %s' % url)
+        response = requests.get(url, headers=self.auth_header, prefetch=False)
+        logger.debug('HTTP response status code: %s' % response.status_code)
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+    def _get_pages(self, path, params=None):
+        """
+        Follows the "next" cursors of a records route, requesting pages of
+        (at most) page_size records, until all records - or, if params
+        contains a limit, that many records - have been fetched.
+        """
+        params = dict(params or {})
+        limit = int(params['limit']) if params.get('limit') else None
+        records = []
+        cursor = 'first'
+        while cursor and (limit is None or len(records) < limit):
+            params['cursor'] = cursor
+            params['limit'] = self.page_size if limit is None \
+                              else min(self.page_size, limit - len(records))
+            page = self._request(path, params)
+            if not isinstance(page, dict) or 'records' not in page:
+                # not a page of records, i.e. a response that is not paged
+                return page
+            records.extend(page['records'])
+            cursor = page['next']
+        return records
 
     def get_root(self, params=None):
         """
@@ -209,7 +313,7 @@ class GiraffeClient(object):
         dicts
         """
         path = '/'.join(['/hosts', str(host), 'meters', str(meter), 'records'])
-        return self._get(path, params)  # .as_(MeterRecord)
+        return self._get(path, params, paginate=True)  # .as_(MeterRecord)
 
     def get_instances(self, params=None):
         """
@@ -247,7 +351,7 @@ class GiraffeClient(object):
         dicts
         """
         path = '/'.join(['/instances', str(inst), 'meters', str(meter), 'records'])
-        return self._get(path, params)  # .as_(MeterRecord)
+        return self._get(path, params, paginate=True)  # .as_(MeterRecord)
 
     def get_projects(self, params=None):
         """
@@ -292,7 +396,18 @@ class GiraffeClient(object):
         dicts
         """
         path = '/'.join(['/projects', str(proj), 'meters', str(meter), 'records'])
-        return self._get(path, params)  # .as_(MeterRecord)
+        return self._get(path, params, paginate=True)  # .as_(MeterRecord)
+
+    def get_proj_usage(self, proj, params=None):
+        """
+        Returns a dict of
+            {'<meter_name>': <usage (float)>}
+        items: the usage of all instances of the given project per
+        cumulative meter (params: start_time, end_time, meters)
+        """
+        path = '/'.join(['/projects', str(proj), 'usage'])
+        result = self._get(path, params)  # ResultSet containing the dict
+        return result[0] if result else {}
 
     def get_users(self, params=None):
         """
@@ -310,7 +425,7 @@ class GiraffeClient(object):
         dicts
         """
         path = '/'.join(['/users', str(user), 'meters', str(meter), 'records'])
-        return self._get(path, params)  # .as_(MeterRecord)
+        return self._get(path, params, paginate=True)  # .as_(MeterRecord)
 
     def get_meters(self, params=None):
         """
@@ -341,7 +456,7 @@ class GiraffeClient(object):
         dicts
         """
         path = '/records'
-        return self._get(path, params)  # .as_(MeterRecord)
+        return self._get(path, params, paginate=True)  # .as_(MeterRecord)
 
     def get_record(self, record, params=None):
         """
@@ -351,3 +466,25 @@ class GiraffeClient(object):
         """
         path = '/'.join(['/records', str(record)])
         return self._get(path, params)  # .as_(MeterRecord)
+
+    def batch(self, queries):
+        """
+        Runs a list of queries for meter records of many entities and meters
+        by means of a single request, e.g.
+            gc.batch([{'entity': 'instance', 'id': <instance_id>,
+                       'meter': <meter_id or name>, 'aggregation': 'sum',
+                       'start_time': '2013-01-01_00-00-00'},
+                      ...])
+        where entity is host, project, user, or instance, and other keys
+        are the query params of the records routes; returns a list of
+        results (None for invalid queries), in the same order.
+        """
+        url = URLBuilder.build(self.protocol, self.endpoint, '/query')
+        logger.debug('Query: %s (%d queries)' % (url, len(queries)))
+        headers = dict(self.auth_header)
+        headers['Content-Type'] = 'application/json'
+        response = requests.post(url, data=json.dumps(queries),
+                                 headers=headers)
+        logger.debug('HTTP response status code: %s' % response.status_code)
+        response.raise_for_status()
+        return response.json
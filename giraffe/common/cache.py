@@ -0,0 +1,86 @@
+__author__ = 'fbahr'
+
+"""
+Bounded, thread-safe in-memory cache with LRU eviction and per-entry TTL.
+
+Usage (example):
+    from giraffe.common.cache import Cache
+
+    cache = Cache(max_size=1000, ttl=600)
+    cache.set('host.name', host)
+    host = cache.get('host.name')             # None if missing or expired
+    cache.set('unknown', None, ttl=60)        # e.g., negative caching
+    'unknown' in cache
+    > True
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+_MISSING = object()
+
+
+class Cache(object):
+
+    def __init__(self, max_size=1000, ttl=None):
+        """
+        Creates a new cache holding at most max_size entries; if ttl (in
+        seconds) is not None, entries expire ttl seconds after being set.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key, count=False) is not _MISSING
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if there is no such
+        (unexpired) entry.
+        """
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=_MISSING):
+        """
+        Caches value for key; ttl (in seconds) overrides the cache's default
+        ttl for this entry, None meaning "does never expire".
+        """
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key, count=True):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > time.time():
+                    # re-insert, s.t. key becomes the most recently used one
+                    self._entries[key] = entry
+                    if count:
+                        self.hits += 1
+                    return value
+            if count:
+                self.misses += 1
+            return _MISSING
@@ -1,6 +1,7 @@
 __author__ = 'marcus'
 
 import time
+from Queue import Queue, Empty
 import pika
 from pika.exceptions import AMQPConnectionError
 
@@ -39,28 +40,83 @@ class Connector(object):
 
 
 class BasicConsumer(object):
-    def __init__(self, connector, queue, exchange, callback):
+    def __init__(self, connector, queue, exchange, callback,
+                 no_ack=True, prefetch_count=0, ack_interval=0.1):
+        """
+        If no_ack is True, callback(body) is called for every message, and
+        messages are considered delivered right away.
+        Otherwise, callback(body, delivery_tag) is called, and each message
+        has to be acknowledged by means of ack() or reject(); at most
+        prefetch_count messages are unacknowledged at any time (0: no limit).
+        """
         self.connector = connector
         self.exchange = exchange
         self.queue = queue
         self.callback = callback
+        self.no_ack = no_ack
+        self.prefetch_count = prefetch_count
+        self.ack_interval = ack_interval
         self.isConsuming = False
+        self._channel = None
+        self._acks = Queue()
 
     def consume(self):
         if not self.isConsuming:
-            channel = self.connector.getChannel()
-            channel.basic_consume(self._consumer_call,
-                                  no_ack=True,
-                                  queue=self.queue)
+            self._channel = self.connector.getChannel()
+            if self.prefetch_count:
+                self._channel.basic_qos(prefetch_count=self.prefetch_count)
+            self._channel.basic_consume(self._consumer_call,
+                                        no_ack=self.no_ack,
+                                        queue=self.queue)
             self.isConsuming = True
-            channel.start_consuming()
+            if self.no_ack:
+                self._channel.start_consuming()
+            else:
+                # pika connections are not thread-safe, hence acks (issued by
+                # any thread) are sent from within the consuming thread
+                while self.isConsuming:
+                    self.connector.getConnection().process_data_events(
+                                                time_limit=self.ack_interval)
+                    self.send_acks()
 
     def stop_consuming(self):
-        self.connector.getChannel().stop_consuming()
+        if self._channel is not None and self.no_ack:
+            self._channel.stop_consuming()
         self.isConsuming = False
 
+    def ack(self, delivery_tag):
+        """
+        Acknowledges a message; can be called from any thread.
+        """
+        self._acks.put((delivery_tag, True, False))
+
+    def reject(self, delivery_tag, requeue=True):
+        """
+        Rejects a message, s.t. it is redelivered if requeue is True (or
+        dropped otherwise); can be called from any thread.
+        """
+        self._acks.put((delivery_tag, False, requeue))
+
+    def send_acks(self):
+        """
+        Sends all pending acks; has to be called from the consuming thread.
+        """
+        while True:
+            try:
+                delivery_tag, ack, requeue = self._acks.get_nowait()
+            except Empty:
+                return
+            if ack:
+                self._channel.basic_ack(delivery_tag=delivery_tag)
+            else:
+                self._channel.basic_nack(delivery_tag=delivery_tag,
+                                         requeue=requeue)
+
     def _consumer_call(self, ch, method, properties, body):
-        self.callback(body)
+        if self.no_ack:
+            self.callback(body)
+        else:
+            self.callback(body, method.delivery_tag)
 
 
 class BasicProducer(object):
@@ -1,11 +1,21 @@
+import time
+from collections import namedtuple
 from datetime import datetime
+from multiprocessing import Pool, cpu_count
+from Queue import Queue, Empty
+from threading import RLock, Thread
 from giraffe.common.message_adapter import MessageAdapter
 from giraffe.common.envelope_adapter import EnvelopeAdapter
 from giraffe.common.crypto import validateSignature
 from giraffe.common.config import Config
+from giraffe.common.cache import Cache
 from giraffe.common.rabbit_mq_connector import Connector, BasicConsumer
 from giraffe.service import db
 from giraffe.service.db import Host, Project, Meter, MeterRecord
+from giraffe.service.db import HourlyRollup, DailyRollup, to_number
+from giraffe.service.db import User, Instance, MeterPresence
+from giraffe.service.instance_resolver import InstanceResolver
+from giraffe.service.retention import RetentionEngine
 # import MySQLdb
 # from giraffe.common.auth import AuthProxy
 from novaclient.v1_1.client import Client as NovaClient
@@ -13,6 +23,46 @@ from novaclient.v1_1.client import Client as NovaClient
 import logging
 _logger = logging.getLogger("service.collector")
 
+# unknown meter names are remembered for UNKNOWN_METER_TTL seconds before
+# meters are re-loaded again
+UNKNOWN_METER_TTL = 60
+_MISSING = object()
+_STOP = object()
+
+# decoded (and validated) messages, as passed from decoding workers to the
+# database writer
+DecodedMessage = namedtuple('DecodedMessage',
+                            'host_name host_records inst_records')
+HostRecord = namedtuple('HostRecord', 'meter_name value duration timestamp')
+InstRecord = namedtuple('InstRecord',
+                        'meter_name value duration timestamp inst_id')
+
+
+def _decode(body, shared_secret):
+    """
+    Deserializes an envelope and validates its signature (executed by a
+    worker process); returns a DecodedMessage, or None if the message is
+    incorrectly formatted or its signature is invalid.
+    """
+    try:
+        envelope = EnvelopeAdapter()
+        envelope.deserialize_from_str(body)
+
+        message = MessageAdapter(envelope.message)
+        if not validateSignature(str(message), shared_secret,
+                                 envelope.signature):
+            return None
+
+        return DecodedMessage(message.host_name,
+                              [HostRecord(r.meter_name, r.value, r.duration,
+                                          r.timestamp)
+                               for r in message.host_records],
+                              [InstRecord(r.meter_name, r.value, r.duration,
+                                          r.timestamp, r.inst_id)
+                               for r in message.inst_records])
+    except Exception:
+        return None
+
 
 class Collector(object):
     def __init__(self):
@@ -27,20 +77,33 @@ class Collector(object):
         self.exchange = self.config.get('rabbit', 'exchange')
         self.routing_key = self.config.get('rabbit', 'routing_key')
 
+        # messages are consumed w/ a prefetch window, decoded and validated
+        # by a pool of worker processes, and written by a single database
+        # writer thread; they are only acknowledged after being committed
         self.consumer = BasicConsumer(self.connector,
                                       self.queue,
                                       self.exchange,
-                                      self._collector_callback)
+                                      self._collector_callback,
+                                      no_ack=False,
+                                      prefetch_count=int(self.config.get(
+                                          'collector', 'prefetch',
+                                          default=200)))
+        self._workers = int(self.config.get('collector', 'workers',
+                                            default=cpu_count()))
+        self._pool = None
+        self._decoded = Queue()
+        self._writer = Thread(target=self._write)
+        self._writer.daemon = True
 
         self.shared_secret = self.config.get('collector', 'shared_secret')
 
         # connect to giraffe database
-        self.db = db.connect('%s://%s:%s@%s/%s'
-                             % (self.config.get('db', 'vendor'),
-                                self.config.get('db', 'user'),
-                                self.config.get('db', 'pass'),
-                                self.config.get('db', 'host'),
-                                self.config.get('db', 'schema')))
+        db_url = '%s://%s:%s@%s/%s' % (self.config.get('db', 'vendor'),
+                                       self.config.get('db', 'user'),
+                                       self.config.get('db', 'pass'),
+                                       self.config.get('db', 'host'),
+                                       self.config.get('db', 'schema'))
+        self.db = db.connect(db_url, **db.pool_options(self.config))
 
         # prepare connection to nova-client
         self._credentials = dict(username=self.config.get('agent', 'user'),
@@ -50,8 +113,74 @@ class Collector(object):
                                  auth_url=self.config.get('auth', 'admin_url'),
                                  insecure=True)
 
-        # known servers/instances
-        self.known_instances = {}
+        # known servers/instances, resolved to (project_id, user_id) tuples
+        # in the background; records of instances not resolved yet are kept
+        # in self._unresolved until the resolver's next refresh - but for
+        # "max_hold" seconds at most, and collected w/o project and user if
+        # the refresh fails (s.t. held messages do not fill the prefetch
+        # window, stalling the consumer)
+        self.resolver = InstanceResolver(
+            self._nova_client,
+            self._instances_resolved,
+            ttl=float(self.config.get('collector', 'nova_ttl', default=300)),
+            min_interval=float(self.config.get('collector', 'nova_interval',
+                                               default=10)))
+        self._unresolved = {}
+        self._held_since = {}  # inst_id -> time its records were first held
+        self._max_hold = float(self.config.get('collector', 'max_hold',
+                                               default=60))
+
+        # meter records are buffered across messages and written in bulk,
+        # either once "batch_size" records are pending or "flush_interval"
+        # seconds after the previous flush; delivery tags of messages whose
+        # records are buffered are acknowledged after the next flush, those
+        # of messages w/ records waiting for the resolver are held back
+        self._batch_size = int(self.config.get('collector', 'batch_size',
+                                               default=500))
+        self._flush_interval = float(self.config.get('collector',
+                                                     'flush_interval',
+                                                     default=5))
+        self._records = []
+        self._records_lock = RLock()
+        self._last_flush = time.time()
+        self._pending_tags = []
+        self._held_tags = {}
+        self._batch_tags = set()  # tags of messages w/ records in the batch
+        self._failed_tags = set()  # tags to be rejected by the next flush
+
+        # raw records older than "raw_days" days are compacted into rollups
+        # and deleted by a background job (w/ a database connection of its
+        # own); disabled if raw_days is 0. Days are only compacted once the
+        # collector's flush window plus "settle_margin" seconds have passed
+        raw_days = int(self.config.get('retention', 'raw_days', default=0))
+        self.retention = None
+        if raw_days:
+            self.retention = RetentionEngine(
+                db.connect(db_url, **db.pool_options(self.config)),
+                raw_days=raw_days,
+                hourly_days=int(self.config.get('retention', 'hourly_days',
+                                                default=0)),
+                batch_size=int(self.config.get('retention', 'batch_size',
+                                               default=5000)),
+                interval=float(self.config.get('retention', 'interval',
+                                               default=3600)),
+                pause=float(self.config.get('retention', 'pause',
+                                            default=0.1)),
+                settle=self._flush_interval
+                       + float(self.config.get('retention', 'settle_margin',
+                                               default=3600)))
+
+        # dimension caches, s.t. steady-state ingest issues no lookup queries;
+        # host activity and project updates are written along with records
+        cache_size = int(self.config.get('collector', 'cache_size',
+                                         default=10000))
+        cache_ttl = float(self.config.get('collector', 'cache_ttl',
+                                          default=600))
+        self._meters = Cache(cache_size, cache_ttl)    # meter name -> id
+        self._hosts = Cache(cache_size, cache_ttl)     # host name -> Host
+        self._projects = Cache(cache_size, cache_ttl)  # proj. uuid -> Project
+        self._dirty_hosts = {}
+        self._dirty_projects = {}
 
     def launch(self):
         try:
@@ -67,11 +196,32 @@ class Collector(object):
 
     def start_collecting(self):
         _logger.debug("Start collecting from broker")
+        # fork worker processes before starting any threads
+        self._pool = Pool(self._workers)
+        self.resolver.start()
+        self._writer.start()
+        if self.retention is not None:
+            self.retention.start()
         self.consumer.consume()
 
     def stop_collecting(self):
         _logger.debug("Stop collecting from broker")
         self.consumer.stop_consuming()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+        self.resolver.stop()
+        if self.retention is not None:
+            self.retention.stop()
+        if self._writer.is_alive():
+            self._decoded.put(_STOP)
+            self._writer.join()
+        try:
+            self.consumer.send_acks()
+        except Exception:
+            _logger.warning('Unable to acknowledge messages; '
+                            'these will be redelivered')
+        self.db.session_close()
 
     def _str_to_datetime(self, timestamp_str):
         return datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
@@ -79,142 +229,358 @@ class Collector(object):
     def _datetime_to_str(self, datetime_obj):
         return datetime_obj.strftime("%Y-%m-%d %H:%M:%S")
 
-    def _collector_callback(self, params):
-        envelope = EnvelopeAdapter()
+    def _collector_callback(self, body, delivery_tag):
+        self._pool.apply_async(_decode, (body, self.shared_secret),
+                               callback=lambda message: self._decoded.put(
+                                                    (delivery_tag, message)))
 
-        # check whether incorrectly formatted message
-        try:
-            envelope.deserialize_from_str(params)
-        except:
-            return
-
-        message = MessageAdapter(envelope.message)
-        # validate signature
-        if not validateSignature(str(message), self.shared_secret,
-                                 envelope.signature):
-            return
+    def _write(self):
+        """
+        Database writer (thread): collects decoded messages, and flushes
+        buffered records once "batch_size" records are pending or every
+        "flush_interval" seconds.
+        """
+        while True:
+            try:
+                item = self._decoded.get(timeout=self._flush_interval)
+            except Empty:
+                item = None
+            if item is _STOP:
+                break
+
+            with self._records_lock:
+                if item is not None:
+                    delivery_tag, message = item
+                    if message is None:
+                        # incorrectly formatted message or invalid signature
+                        self.consumer.ack(delivery_tag)
+                    else:
+                        mark = len(self._records)
+                        try:
+                            self._collect(message, delivery_tag)
+                        except Exception as e:
+                            # e.g., lost database connection: the message is
+                            # redelivered (w/o any of its records written)
+                            _logger.exception(e)
+                            self.db.rollback()
+                            del self._records[mark:]
+                            self._drop([delivery_tag])
+                            self.consumer.reject(delivery_tag, requeue=True)
+                self._release_expired()
+                if len(self._records) >= self._batch_size \
+                   or time.time() - self._last_flush >= self._flush_interval:
+                    self._flush_records()
+
+        self._flush_records()
+        self.db.session_close()
 
+    def _collect(self, message, delivery_tag=None):
         self.db.session_open()
 
-        # load all meters now to avoid queries later
-        meters = self.db.load(Meter)
-        meter_dict = {}
-        for meter in meters:
-            meter_dict[meter.name] = meter
-
         # insert host if it does not exist yet
-        hosts = self.db.load(Host, {'name': message.host_name}, limit=1)
-        if not hosts:
-            host = Host(name=message.host_name)
-            self.db.save(host)
-            self.db.commit()
-        else:
-            host = hosts[0]
-
-        # insert all host records
+        host = self._host(message.host_name)
+
+        # buffer all host records
         for r in message.host_records:
-            if r.meter_name not in meter_dict:
+            meter_id = self._meter_id(r.meter_name)
+            if meter_id is None:
                 _logger.warning('Unknown meter_name "%s"' % r.meter_name)
                 continue
             try:
-                record = MeterRecord(meter_id=meter_dict[r.meter_name].id,
-                                     host_id=host.id,
-                                     user_id=None,
-                                     resource_id=None,
-                                     project_id=None,
-                                     value=r.value,
-                                     duration=r.duration,
-                                     timestamp=r.timestamp)
-                self.db.save(record)
-                _logger.debug("New %s" % record)
+                record_timestamp = self._str_to_datetime(r.timestamp)
+                if delivery_tag is not None:
+                    self._batch_tags.add(delivery_tag)
+                self._records.append(dict(meter_id=meter_id,
+                                          host_id=host.id,
+                                          user_id=None,
+                                          resource_id=None,
+                                          project_id=None,
+                                          value=r.value,
+                                          numeric_value=to_number(r.value),
+                                          duration=r.duration,
+                                          timestamp=record_timestamp))
 
                 # update host activity
-                record_timestamp = self._str_to_datetime(r.timestamp)
                 if not host.activity or record_timestamp > host.activity:
                     host.activity = record_timestamp
+                    self._dirty_hosts[host.name] = host
 
             except Exception as e:
                 _logger.exception(e)
 
-        # insert all instance records
+        # buffer all instance records
         for r in message.inst_records:
-            if r.meter_name not in meter_dict:
+            meter_id = self._meter_id(r.meter_name)
+            if meter_id is None:
                 _logger.warning('Unknown meter_name "%s"' % r.meter_name)
                 continue
             try:
-                # @[fbahr] - TODO: `self.known_instances` grows over time
-                #                  towards inf. - clean-up?
-                if not r.inst_id in self.known_instances:
-                    self.known_instances[r.inst_id] = self._metadata(uuid=r.inst_id)
+                self._collect_inst_record(host, meter_id, r.inst_id, r.value,
+                                          r.duration,
+                                          self._str_to_datetime(r.timestamp),
+                                          delivery_tag)
+            except Exception as e:
+                _logger.exception(e)
 
-                r.project_id, r.user_id = self.known_instances[r.inst_id]
+        if delivery_tag is not None and delivery_tag not in self._held_tags:
+            self._pending_tags.append(delivery_tag)
+
+    def _collect_inst_record(self, host, meter_id, inst_id, value, duration,
+                             record_timestamp, delivery_tag=None,
+                             resolve=True):
+        metadata = self.resolver.get(inst_id) if resolve else (None, None)
+        if metadata is None:
+            if not self.resolver.is_unknown(inst_id):
+                # wait for the resolver (see _instances_resolved)
+                self._unresolved.setdefault(inst_id, []).append(
+                    (host, meter_id, inst_id, value, duration,
+                     record_timestamp, delivery_tag))
+                self._held_since.setdefault(inst_id, time.time())
+                if delivery_tag is not None:
+                    self._held_tags[delivery_tag] = \
+                        self._held_tags.get(delivery_tag, 0) + 1
+                return
+            _logger.warning('Unknown instance "%s"' % inst_id)
+            metadata = (None, None)
+
+        project_id, user_id = metadata
+        if delivery_tag is not None:
+            self._batch_tags.add(delivery_tag)
+        self._records.append(dict(meter_id=meter_id,
+                                  host_id=host.id,
+                                  user_id=user_id,
+                                  resource_id=inst_id,
+                                  project_id=project_id,
+                                  value=value,
+                                  numeric_value=to_number(value),
+                                  duration=duration,
+                                  timestamp=record_timestamp))
+
+        # update host and project activity
+        if not host.activity or record_timestamp > host.activity:
+            host.activity = record_timestamp
+            self._dirty_hosts[host.name] = host
+        if project_id is not None:
+            # insert project if it does not exist yet
+            project = self._project(project_id, record_timestamp)
+            if not project.updated_at or record_timestamp > project.updated_at:
+                project.updated_at = record_timestamp
+                self._dirty_projects[project.uuid] = project
+
+    def _instances_resolved(self, resolver):
+        """
+        Called by the resolver after each refresh; collects all records that
+        were waiting for their instances to be resolved - w/o project and
+        user, if the refresh failed.
+        """
+        with self._records_lock:
+            unresolved, self._unresolved = self._unresolved, {}
+            self._held_since = {}
+            if not unresolved:
+                return
+            if resolver.failed:
+                _logger.warning('Collecting records of %d instances w/o '
+                                'project and user' % len(unresolved))
+            self.db.session_open()
+            self._collect_held(unresolved, resolve=not resolver.failed)
+            # ^note: runs on the resolver's thread, i.e. w/ a session of its
+            #        own (see Db) - which is released until the next refresh
+            self.db.session_close()
+
+    def _release_expired(self):
+        """
+        Collects the records of instances that have been waiting for the
+        resolver for more than "max_hold" seconds w/o project and user.
+        """
+        now = time.time()
+        with self._records_lock:
+            expired = dict((inst_id, self._unresolved.pop(inst_id, []))
+                           for inst_id, since in self._held_since.items()
+                           if now - since >= self._max_hold)
+            if not expired:
+                return
+            for inst_id in expired:
+                del self._held_since[inst_id]
+            _logger.warning('%d instances not resolved within %ds, '
+                            'collecting their records w/o project and user'
+                            % (len(expired), self._max_hold))
+            self._collect_held(expired, resolve=False)
+
+    def _collect_held(self, unresolved, resolve=True):
+        """
+        Collects records that were waiting for the resolver (a dict of
+        inst_id/records-pairs); messages whose records cannot be collected
+        are rejected by the next flush (see _flush_records).
+        """
+        failed = set()
+        for records in unresolved.values():
+            for record in records:
+                delivery_tag = record[-1]
+                if delivery_tag is not None and delivery_tag in failed:
+                    continue
+                try:
+                    self._collect_inst_record(*record, resolve=resolve)
+                except Exception as e:
+                    _logger.exception(e)
+                    if delivery_tag is not None:
+                        failed.add(delivery_tag)
+                    continue
+
+                if delivery_tag is not None:
+                    self._held_tags[delivery_tag] -= 1
+                    if not self._held_tags[delivery_tag]:
+                        del self._held_tags[delivery_tag]
+                        self._pending_tags.append(delivery_tag)
+        if failed:
+            self._drop(failed)
+            self._failed_tags |= failed
+
+    def _meter_id(self, meter_name):
+        """
+        Returns the id of the meter named meter_name, or None if there is no
+        such meter; all meters are re-loaded if meter_name is not cached.
+        """
+        meter_id = self._meters.get(meter_name, _MISSING)
+        if meter_id is _MISSING:
+            meter_id = None
+            for meter in self.db.load(Meter):
+                self._meters.set(meter.name, meter.id)
+                if meter.name == meter_name:
+                    meter_id = meter.id
+            if meter_id is None:
+                self._meters.set(meter_name, None, ttl=UNKNOWN_METER_TTL)
+        return meter_id
+
+    def _host(self, host_name):
+        """
+        Returns the (detached) Host object named host_name; inserts the host
+        if it does not exist yet.
+        """
+        host = self._hosts.get(host_name)
+        if host is None:
+            # hosts w/ pending activity updates are preferred over reloading
+            host = self._dirty_hosts.get(host_name)
+            if host is None:
+                hosts = self.db.load(Host, {'name': host_name}, limit=1)
+                if not hosts:
+                    self.db.save(Host(name=host_name))
+                    self.db.commit()
+                    hosts = self.db.load(Host, {'name': host_name}, limit=1)
+                host = hosts[0]
+                self.db.expunge(host)
+            self._hosts.set(host_name, host)
+        return host
 
-                # insert project if it does not exist yet
-                projects = self.db.load(Project,
-                                        {'uuid': r.project_id},
+    def _project(self, project_uuid, created_at):
+        """
+        Returns the (detached) Project object for project_uuid; inserts the
+        project if it does not exist yet.
+        """
+        project = self._projects.get(project_uuid)
+        if project is None:
+            project = self._dirty_projects.get(project_uuid)
+            if project is None:
+                projects = self.db.load(Project, {'uuid': project_uuid},
                                         limit=1)
                 if not projects:
-                    project = Project(uuid=r.project_id,
-                                      created_at=self._str_to_datetime(r.timestamp))
-                    self.db.save(project)
+                    self.db.save(Project(uuid=project_uuid,
+                                         created_at=created_at))
                     self.db.commit()
-                else:
-                    project = projects[0]
-
-                record = MeterRecord(meter_id=meter_dict[r.meter_name].id,
-                                     host_id=host.id,
-                                     user_id=r.user_id,
-                                     resource_id=r.inst_id,
-                                     project_id=r.project_id,
-                                     value=r.value,
-                                     duration=r.duration,
-                                     timestamp=r.timestamp)
-                self.db.save(record)
-                _logger.debug("New %s" % record)
-
-                # update host and project activity
-                record_timestamp = self._str_to_datetime(r.timestamp)
-                if not host.activity or record_timestamp > host.activity:
-                    host.activity = record_timestamp
-                if not project.updated_at or record_timestamp > project.updated_at:
-                    project.updated_at = record_timestamp
-
+                    projects = self.db.load(Project, {'uuid': project_uuid},
+                                            limit=1)
+                project = projects[0]
+                self.db.expunge(project)
+            self._projects.set(project_uuid, project)
+        return project
+
+    def _flush_records(self):
+        """
+        Writes all buffered meter records by means of a bulk insert and
+        commits them - together with their hourly/daily rollups, the user,
+        instance and meter presence tables, and pending host and project
+        updates;
+        acknowledges the respective messages if successful, or has them
+        redelivered otherwise.
+        """
+        with self._records_lock:
+            self._last_flush = time.time()
+            records, self._records = self._records, []
+            delivery_tags, self._pending_tags = self._pending_tags, []
+            batch_tags, self._batch_tags = self._batch_tags, set()
+            failed_tags, self._failed_tags = self._failed_tags, set()
+            for delivery_tag in failed_tags:
+                self.consumer.reject(delivery_tag, requeue=True)
+            if not records and not delivery_tags:
+                return
+
+            self.db.session_open()
+            try:
+                self.db.bulk_insert(MeterRecord, records)
+                for rollup_cls in (HourlyRollup, DailyRollup):
+                    self.db.merge_rollups(rollup_cls,
+                                          rollup_cls.aggregate(records))
+                for dimension_cls in (User, Instance, MeterPresence):
+                    self.db.merge_seen(dimension_cls,
+                                       dimension_cls.aggregate(records))
+                for host in self._dirty_hosts.values():
+                    self.db.update(Host, {'activity': host.activity},
+                                   {'id': host.id})
+                for project in self._dirty_projects.values():
+                    self.db.update(Project, {'updated_at': project.updated_at},
+                                   {'id': project.id})
+                self.db.commit()
+                self._dirty_hosts.clear()
+                self._dirty_projects.clear()
+                _logger.debug("Inserted %d meter records" % len(records))
             except Exception as e:
+                self.db.rollback()
                 _logger.exception(e)
+                # all messages w/ records in the batch are redelivered - incl.
+                # those w/ records still waiting for the resolver, which are
+                # dropped (and never acknowledged)
+                failed_tags = (set(delivery_tags) | batch_tags) - failed_tags
+                self._drop(failed_tags)
+                for delivery_tag in failed_tags:
+                    self.consumer.reject(delivery_tag, requeue=True)
+            else:
+                for delivery_tag in delivery_tags:
+                    self.consumer.ack(delivery_tag)
+
+    def _drop(self, delivery_tags):
+        """
+        Drops the records of the given messages that are waiting for the
+        resolver, s.t. the messages can be rejected (and redelivered).
+        """
+        delivery_tags = set(delivery_tags)
+        with self._records_lock:
+            for inst_id in list(self._unresolved):
+                records = [record for record in self._unresolved[inst_id]
+                           if record[-1] not in delivery_tags]
+                if records:
+                    self._unresolved[inst_id] = records
+                else:
+                    del self._unresolved[inst_id]
+                    self._held_since.pop(inst_id, None)
+            for delivery_tag in delivery_tags:
+                self._held_tags.pop(delivery_tag, None)
+                self._batch_tags.discard(delivery_tag)
 
-        try:
-            self.db.commit()
-        except Exception as e:
-            self.db.rollback()
-            _logger.exception(e)
-        self.db.session_close()
-
-    def _metadata(self, uuid):
+    def _nova_client(self):
         """
-        Connect to nova database (by means of nova-client);
-        fetches (project_id, user_id) information for a given instance uuid.
+        Returns a new nova-client connection (used by the instance resolver
+        to fetch (project_id, user_id) information for all instances).
         """
-        nova_client = NovaClient(username=self._credentials['username'],
-                                 api_key=self._credentials['password'],
-                                 project_id=self._credentials['tenant_name'],
-                                 auth_url=self._credentials['auth_url'],
-                                 service_type='compute',
-                                 insecure=True)
+        return NovaClient(username=self._credentials['username'],
+                          api_key=self._credentials['password'],
+                          project_id=self._credentials['tenant_name'],
+                          auth_url=self._credentials['auth_url'],
+                          service_type='compute',
+                          insecure=True)
 
         # self._credentials['auth_token'] = AuthProxy.get_token(**self._credentials)
         # nova_client.client.auth_token = self._credentials['auth_token']
         # nova_client.client.authenticate()
 
-        # unfortunately, nova_client.servers.find(id=...) is restricted
-        # to instances in an user's tentant (project) [can't tweek that,
-        # hard-coded in find()] - but:
-        search_opts = {'all_tenants': 1}
-        server = next((s.user_id,  s.tenant_id)
-                          for s in nova_client.servers.list(True, search_opts)
-                          if s.id == uuid)
-        return map(str, server)
-        # ...does the 'trick', too.
-
         # DEPRECATED: ---------------------------------------------------------
         #
         # nova_db = MySQLdb.connect(self.config.get('nova-db', 'host'),
@@ -0,0 +1,133 @@
+__author__ = 'fbahr'
+
+"""
+Resolves nova instance UUIDs to (project_id, user_id) tuples.
+
+Instead of listing all servers for every single unknown instance, the
+resolver fetches the full server list (across all tenants) once, and
+refreshes it in the background every "ttl" seconds. Lookups never block:
+unknown UUIDs are collected and resolved in batch by the next refresh
+(at most every "min_interval" seconds); registered callbacks are notified
+after every refresh - also after failed ones, w/ "failed" set. UUIDs not found by a refresh are considered unknown
+for "unknown_ttl" seconds (i.e., not looked up again), unless a later
+refresh finds them.
+
+Usage (example):
+    resolver = InstanceResolver(lambda: NovaClient(...), callback, ttl=300)
+    resolver.start()
+
+    resolver.get(uuid)
+    > ('<project_id>', '<user_id>'), or None if not (yet) resolved
+    resolver.is_unknown(uuid)
+    > True if uuid was not found by a refresh (within unknown_ttl seconds)
+"""
+
+import time
+from threading import Event, Lock
+from giraffe.common.cache import Cache
+from giraffe.common.task import Task
+
+import logging
+_logger = logging.getLogger('service.collector')
+
+
+class InstanceResolver(Task):
+
+    def __init__(self, client_factory, callback, ttl=300, min_interval=10,
+                 unknown_ttl=None, max_unknown=10000):
+        """
+        client_factory is expected to return a nova client (or a stand-in
+        providing servers.list(detailed, search_opts)); callback is called
+        w/ the resolver as its only parameter after every refresh. At most
+        max_unknown unknown UUIDs are kept, for unknown_ttl (default: ttl)
+        seconds each.
+        """
+        Task.__init__(self, callback)
+        self.daemon = True
+        self.known_instances = {}
+        self.failed = False  # True if the last refresh failed
+        self._client_factory = client_factory
+        self._ttl = ttl
+        self._min_interval = min_interval
+        self._requested = set()
+        self._unknown = Cache(max_unknown,
+                              ttl if unknown_ttl is None else unknown_ttl)
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._stopped = Event()
+
+    def get(self, uuid):
+        """
+        Returns the (project_id, user_id) tuple for the given instance, or
+        None if it is not known (yet) - in which case it is looked up by the
+        next refresh.
+        """
+        metadata = self.known_instances.get(uuid)
+        if metadata is None:
+            with self._lock:
+                if uuid not in self._unknown and uuid not in self._requested:
+                    self._requested.add(uuid)
+                    self._wakeup.set()
+        return metadata
+
+    def is_unknown(self, uuid):
+        """
+        Returns True if the given instance has been looked up, but was not
+        found by a refresh within the last unknown_ttl seconds (nor since).
+        """
+        return uuid not in self.known_instances and uuid in self._unknown
+
+    def refresh(self):
+        """
+        Fetches the full list of servers and replaces known_instances.
+        """
+        with self._lock:
+            requested, self._requested = self._requested, set()
+
+        # unfortunately, nova_client.servers.find(id=...) is restricted
+        # to instances in an user's tentant (project) - but:
+        try:
+            servers = self._client_factory().servers.list(True,
+                                                          {'all_tenants': 1})
+        except Exception:
+            with self._lock:
+                self._requested |= requested
+            raise
+
+        known_instances = dict((str(s.id), (str(s.tenant_id), str(s.user_id)))
+                               for s in servers)
+
+        with self._lock:
+            self.known_instances = known_instances
+            for uuid in requested:
+                if uuid not in known_instances:
+                    self._unknown.set(uuid, True)
+        _logger.debug('Resolved %d instances (%d unknown)'
+                      % (len(known_instances), len(self._unknown)))
+
+    def run(self):
+        self.isRunning = True
+        while not self.requestStop:
+            self._wakeup.clear()
+            started = time.time()
+            try:
+                self.refresh()
+                self.failed = False
+            except Exception:
+                _logger.exception('Unable to resolve instances')
+                self.failed = True
+            try:
+                self.notifyCallback(self)
+            except Exception:
+                _logger.exception('Unable to notify callbacks')
+
+            # batch lookups: refresh at most every min_interval seconds, but
+            # (w/o any lookups pending) at least every ttl seconds
+            self._stopped.wait(self._min_interval)
+            self._wakeup.wait(max(0, self._ttl - (time.time() - started)))
+        self.isRunning = False
+
+    def stop(self):
+        self.requestStop = True
+        self._stopped.set()
+        self._wakeup.set()
@@ -0,0 +1,280 @@
+__author__ = 'fbahr'
+
+"""
+Per-route request metrics of the REST API, in Prometheus text format.
+
+For every route, the number of requests (per status), a histogram of
+latencies, the time spent executing database queries vs. the rest (i.e.,
+mapping and serializing results), the number of rows returned by database
+queries (as reported by the driver, i.e. cursor.rowcount), and the number
+of bytes sent are recorded. Query times and rows are measured by means of
+engine events, per thread; queries of streamed results (see Db.iter_load,
+which run after a response has been returned - and whose rowcount is
+unknown) are not accounted.
+
+Metrics are kept per process; for multiple (e.g., gunicorn worker)
+processes, share() them via a directory before forking: every process
+then writes its metrics to a file of its own in that directory after every
+request, and render() aggregates the files of all processes (including
+exited ones, s.t. counters do not decrease).
+
+Requests are measured by a WSGI middleware (see Metrics.middleware), s.t.
+requests that raise an exception are recorded (w/ status 500) as well; the
+application sets the route of a request as environ[ROUTE].
+
+Usage (example):
+    metrics = Metrics()
+    metrics.instrument(db)
+    metrics.share('/tmp/giraffe-metrics')   # optional, see above
+    app.wsgi_app = metrics.middleware(app.wsgi_app)
+    ...
+    start = metrics.start()                 # or, per request, ...
+    metrics.observe('/hosts', 200, time.time() - start, 1024)
+    metrics.render()
+    > # HELP giraffe_api_requests_total ...
+"""
+
+import copy
+import glob
+import json
+import os
+import time
+from threading import Lock, local
+
+# upper bounds of the latency histogram's buckets (in seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_START = 'giraffe.metrics.query_start'
+# WSGI environ key of a request's route (set by the application)
+ROUTE = 'giraffe.metrics.route'
+
+
+class _RouteMetrics(object):
+
+    def __init__(self, buckets):
+        self.requests = {}               # status -> count
+        self.buckets = [0] * len(buckets)
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+
+class Metrics(object):
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.directory = None
+        self._routes = {}
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._local = local()
+
+    def share(self, directory):
+        """
+        Shares the metrics of this process and of all processes forked
+        afterwards via the given directory (created if necessary); metrics
+        of earlier runs are removed.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+        self.directory = directory
+
+    def instrument(self, db):
+        """
+        Measures the time and number of rows of all queries of the given Db
+        object (and its replicas).
+        """
+        db.listen('before_cursor_execute', self._before_query)
+        db.listen('after_cursor_execute', self._after_query)
+
+    def start(self):
+        """
+        Starts measuring a request (of the current thread); returns the
+        current time.
+        """
+        self._local.db_seconds = 0.0
+        self._local.rows = 0
+        return time.time()
+
+    def observe(self, route, status, seconds, size):
+        """
+        Records a request of the given route that has been served (w/ the
+        given HTTP status code and response size in bytes) in "seconds"
+        since start() has been called.
+        """
+        db_seconds = getattr(self._local, 'db_seconds', 0.0)
+        rows = getattr(self._local, 'rows', 0)
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked: metrics of the parent are its own
+                self._routes, self._pid = {}, os.getpid()
+            metrics = self._routes.get(route)
+            if metrics is None:
+                metrics = self._routes[route] = _RouteMetrics(self.buckets)
+            metrics.requests[status] = metrics.requests.get(status, 0) + 1
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    metrics.buckets[i] += 1
+            metrics.seconds += seconds
+            metrics.db_seconds += db_seconds
+            metrics.rows += rows
+            metrics.bytes += size or 0
+            if self.directory is not None:
+                self._write()
+
+    def middleware(self, app):
+        """
+        Returns a WSGI application measuring all requests passed to app, per
+        environ[ROUTE] ("unmatched" if not set); requests raising an
+        exception are recorded w/ status 500.
+        """
+        def measured_app(environ, start_response):
+            start = self.start()
+            response = {}
+
+            def record_response(status, headers, exc_info=None):
+                response['status'] = int(status.split(' ', 1)[0])
+                response['size'] = dict((name.lower(), value)
+                                        for name, value in headers)\
+                                   .get('content-length')
+                return start_response(status, headers, exc_info)
+
+            try:
+                result = app(environ, record_response)
+            except Exception:
+                self.observe(environ.get(ROUTE, 'unmatched'), 500,
+                             time.time() - start, 0)
+                raise
+            size = response.get('size')
+            self.observe(environ.get(ROUTE, 'unmatched'),
+                         response.get('status', 500), time.time() - start,
+                         int(size) if size else None)
+            return result
+        return measured_app
+
+    def render(self):
+        """
+        Returns all metrics in Prometheus text format - of all processes, if
+        shared (see share()).
+        """
+        if self.directory is not None:
+            routes = sorted(self._read().items())
+        else:
+            with self._lock:
+                routes = sorted((route, _snapshot(m))
+                                for route, m in self._routes.items())
+        lines = []
+
+        def family(name, kind, doc):
+            lines.append('# HELP %s %s' % (name, doc))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        family('giraffe_api_requests_total', 'counter',
+               'Requests served, per route and status.')
+        for route, m in routes:
+            for status, count in sorted(m.requests.items()):
+                lines.append('giraffe_api_requests_total{route="%s",'
+                             'status="%s"} %d' % (_escape(route), status,
+                                                  count))
+
+        family('giraffe_api_request_duration_seconds', 'histogram',
+               'Latency of requests, per route.')
+        for route, m in routes:
+            label = 'route="%s"' % _escape(route)
+            for bound, count in zip(self.buckets, m.buckets):
+                lines.append('giraffe_api_request_duration_seconds_bucket'
+                             '{%s,le="%s"} %d' % (label, bound, count))
+            total = sum(m.requests.values())
+            lines.append('giraffe_api_request_duration_seconds_bucket'
+                         '{%s,le="+Inf"} %d' % (label, total))
+            lines.append('giraffe_api_request_duration_seconds_sum{%s} %s'
+                         % (label, m.seconds))
+            lines.append('giraffe_api_request_duration_seconds_count{%s} %d'
+                         % (label, total))
+
+        for name, doc, value in (
+                ('giraffe_api_db_seconds_total',
+                 'Time spent executing database queries, per route.',
+                 lambda m: m.db_seconds),
+                ('giraffe_api_serialize_seconds_total',
+                 'Time spent outside of database queries (i.e., mapping '
+                 'and serializing results), per route.',
+                 lambda m: max(0.0, m.seconds - m.db_seconds)),
+                ('giraffe_api_rows_total',
+                 'Rows returned by (non-streamed) database queries, as '
+                 'reported by the driver, per route.',
+                 lambda m: m.rows),
+                ('giraffe_api_response_bytes_total',
+                 'Bytes of (non-streamed) responses, per route.',
+                 lambda m: m.bytes)):
+            family(name, 'counter', doc)
+            for route, m in routes:
+                lines.append('%s{route="%s"} %s' % (name, _escape(route),
+                                                    value(m)))
+        return '\n'.join(lines) + '\n'
+
+    def _write(self):
+        """
+        Writes this process's metrics to its file in the shared directory
+        (atomically, s.t. readers never see a partial file); to be called
+        while holding the lock.
+        """
+        path = os.path.join(self.directory, '%d.json' % self._pid)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(dict((route, m.__dict__)
+                           for route, m in self._routes.items()), f)
+        os.rename(path + '.tmp', path)
+
+    def _read(self):
+        """
+        Returns the metrics of all processes sharing the directory, summed up
+        per route.
+        """
+        routes = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    processes = json.load(f)
+            except (IOError, ValueError):
+                # e.g., removed by share() meanwhile
+                continue
+            for route, values in processes.items():
+                route = route.encode('utf-8')
+                metrics = routes.get(route)
+                if metrics is None:
+                    metrics = routes[route] = _RouteMetrics(self.buckets)
+                for status, count in values['requests'].items():
+                    metrics.requests[int(status)] = \
+                        metrics.requests.get(int(status), 0) + count
+                metrics.buckets = [a + b for a, b in zip(metrics.buckets,
+                                                         values['buckets'])]
+                for key in ('seconds', 'db_seconds', 'rows', 'bytes'):
+                    setattr(metrics, key, getattr(metrics, key) + values[key])
+        return routes
+
+    def _before_query(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        conn.info.setdefault(_QUERY_START, []).append(time.time())
+
+    def _after_query(self, conn, cursor, statement, parameters, context,
+                     executemany):
+        seconds = time.time() - conn.info[_QUERY_START].pop()
+        self._local.db_seconds = getattr(self._local, 'db_seconds', 0.0) \
+                                 + seconds
+        # ^note: rowcount is -1 (or 0) if unknown, e.g. for streamed results
+        self._local.rows = getattr(self._local, 'rows', 0) \
+                           + max(0, cursor.rowcount)
+
+
+def _snapshot(metrics):
+    snapshot = copy.copy(metrics)
+    snapshot.requests = dict(metrics.requests)
+    snapshot.buckets = list(metrics.buckets)
+    return snapshot
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')\
+                .replace('\n', '\\n')
@@ -0,0 +1,177 @@
+__author__ = 'fbahr'
+
+"""
+Manages the range partitions of the meter_record table.
+
+meter_record is partitioned by RANGE (UNIX_TIMESTAMP(meter_timestamp)), one
+partition per period of "months" months (named p<YYYYMM> after the period's
+first month), plus a catch-all partition "pmax". Maintenance pre-creates
+the partitions of the next "ahead" periods - by splitting the (empty) pmax
+partition - and drops partitions whose records are all older than
+"retention" months, which is O(1) as opposed to DELETEing rows.
+
+If meter_record is not partitioned yet, maintenance converts it; note that
+this rebuilds the table once (and drops its foreign keys, which MySQL does
+not support for partitioned tables).
+
+Usage (example):
+    from giraffe.service.partitions import PartitionManager
+
+    manager = PartitionManager(db._engine, months=1, ahead=3, retention=12)
+    created, dropped = manager.maintain()
+"""
+
+from datetime import datetime
+
+import logging
+_logger = logging.getLogger('service.partitions')
+
+TABLE = 'meter_record'
+COLUMN = 'meter_timestamp'
+MAX_PARTITION = 'pmax'
+
+
+def add_months(dt, months):
+    """
+    Returns the first day (00:00:00) of the month "months" months after the
+    one of dt.
+    """
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def period_start(dt, months=1):
+    """
+    Returns the start of the period of "months" months that dt belongs to;
+    periods are aligned to January, 1st of year 0.
+    """
+    index = dt.year * 12 + dt.month - 1
+    return add_months(datetime(dt.year, dt.month, 1), -(index % months))
+
+
+def partition_name(start):
+    return 'p%s' % start.strftime('%Y%m')
+
+
+def partition_plan(existing, now, months=1, ahead=3, retention=0,
+                   oldest=None):
+    """
+    Returns (create, drop): the list of (name, upper bound) tuples of
+    partitions to create (in order, all of them before pmax), and the list
+    of names of partitions to drop.
+
+    existing is the list of (name, upper bound) tuples of the current
+    partitions (upper bound None for pmax), empty if the table is not
+    partitioned yet; in that case, partitions start w/ the period of the
+    oldest record (or now). retention (in months) of 0 keeps everything.
+    """
+    bounds = [upper for (_, upper) in existing if upper is not None]
+    if bounds:
+        start = max(bounds)
+    else:
+        start = period_start(oldest or now, months)
+    last = add_months(period_start(now, months), (ahead + 1) * months)
+
+    create = []
+    while start < last:
+        create.append((partition_name(start), add_months(start, months)))
+        start = add_months(start, months)
+
+    drop = []
+    if retention:
+        cutoff = add_months(datetime(now.year, now.month, 1), -retention)
+        drop = [name for (name, upper) in existing
+                if upper is not None and upper <= cutoff]
+    return create, drop
+
+
+class PartitionManager(object):
+
+    def __init__(self, engine, months=1, ahead=3, retention=0):
+        """
+        engine is expected to be a SQLAlchemy engine connected to the
+        Giraffe (MySQL) database; months is the length of a partition's
+        period, ahead the number of periods to create in advance, and
+        retention the number of months to keep (0: keep everything).
+        """
+        self._engine = engine
+        self.months = months
+        self.ahead = ahead
+        self.retention = retention
+
+    def partitions(self):
+        """
+        Returns the list of (name, upper bound) tuples of meter_record's
+        partitions, in order; upper bound is None for pmax. The list is
+        empty if meter_record is not partitioned.
+        """
+        rows = self._engine.execute(
+            "SELECT PARTITION_NAME, "
+            "IF(PARTITION_DESCRIPTION = 'MAXVALUE', NULL, "
+            "FROM_UNIXTIME(PARTITION_DESCRIPTION)) "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '%s' "
+            "AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION" % TABLE)
+        return [(name, upper) for (name, upper) in rows]
+
+    def maintain(self, now=None):
+        """
+        Creates and drops partitions according to partition_plan(), and
+        returns the (create, drop) plan that has been applied.
+        """
+        now = now or datetime.now()
+        existing = self.partitions()
+        oldest = None
+        if not existing:
+            oldest = self._engine.execute('SELECT MIN(%s) FROM %s'
+                                          % (COLUMN, TABLE)).scalar()
+        create, drop = partition_plan(existing, now, self.months, self.ahead,
+                                      self.retention, oldest)
+
+        definitions = ', '.join(["PARTITION %s VALUES LESS THAN "
+                                 "(UNIX_TIMESTAMP('%s'))"
+                                 % (name, upper.strftime('%Y-%m-%d %H:%M:%S'))
+                                 for (name, upper) in create]
+                                + ['PARTITION %s VALUES LESS THAN MAXVALUE'
+                                   % MAX_PARTITION])
+        if not existing:
+            self._prepare()
+            _logger.info('Partitioning %s (%d partitions)'
+                         % (TABLE, len(create) + 1))
+            self._engine.execute('ALTER TABLE %s PARTITION BY RANGE '
+                                 '(UNIX_TIMESTAMP(%s)) (%s)'
+                                 % (TABLE, COLUMN, definitions))
+        elif create:
+            _logger.info('Creating partitions %s'
+                         % ', '.join(name for (name, _) in create))
+            self._engine.execute('ALTER TABLE %s REORGANIZE PARTITION %s '
+                                 'INTO (%s)'
+                                 % (TABLE, MAX_PARTITION, definitions))
+
+        if drop:
+            _logger.info('Dropping partitions %s' % ', '.join(drop))
+            self._engine.execute('ALTER TABLE %s DROP PARTITION %s'
+                                 % (TABLE, ', '.join(drop)))
+        return create, drop
+
+    def _prepare(self):
+        """
+        Drops meter_record's foreign keys and makes meter_timestamp part of
+        its primary key, both required for partitioning by meter_timestamp.
+        """
+        foreign_keys = [row[0] for row in self._engine.execute(
+            "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '%s' "
+            "AND CONSTRAINT_TYPE = 'FOREIGN KEY'" % TABLE)]
+        for name in foreign_keys:
+            self._engine.execute('ALTER TABLE %s DROP FOREIGN KEY %s'
+                                 % (TABLE, name))
+
+        primary_key = [row[0] for row in self._engine.execute(
+            "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '%s' "
+            "AND CONSTRAINT_NAME = 'PRIMARY'" % TABLE)]
+        if COLUMN not in primary_key:
+            self._engine.execute('ALTER TABLE %s DROP PRIMARY KEY, '
+                                 'ADD PRIMARY KEY (id, %s)' % (TABLE, COLUMN))
@@ -0,0 +1,120 @@
+__author__ = 'fbahr'
+
+"""
+Picks read replicas for giraffe.service.db.Db.
+
+Replicas are health-checked every "check_interval" seconds by a background
+thread (started by the first pick() of each process, s.t. forked workers
+check on their own): a replica is used if it answers, and (if it reports a
+replication status at all) replicates and lags behind its primary by at
+most "max_lag" seconds. pick() never waits for a check: healthy replicas
+are picked round robin; if there is none (or no check has completed yet),
+pick() returns None - i.e., reads fall back to the primary.
+
+Usage (example):
+    replicas = Replicas([engine_1, engine_2], max_lag=30)
+    engine = replicas.pick() or primary_engine
+"""
+
+import os
+import time
+from threading import Event, Lock, Thread
+
+import logging
+_logger = logging.getLogger('service.db')
+
+
+class Replicas(object):
+
+    def __init__(self, engines, max_lag=30, check_interval=5):
+        """
+        engines is expected to be a list of SQLAlchemy engines (or objects
+        providing execute(statement) and url.host).
+        """
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._healthy = []
+        self._checked = None
+        self._next = 0
+        self._lock = Lock()
+        self._checker_pid = None
+        self._stopped = Event()
+
+    def pick(self):
+        """
+        Returns the engine of a healthy replica, or None if there is none
+        (as of the last health check).
+        """
+        self._start_checker()
+        with self._lock:
+            if not self._healthy:
+                return None
+            self._next = (self._next + 1) % len(self._healthy)
+            return self._healthy[self._next]
+
+    def mark_failed(self, engine):
+        """
+        Stops using the given replica until the next health check.
+        """
+        with self._lock:
+            if engine in self._healthy:
+                _logger.warning('Replica %s failed' % engine.url.host)
+                self._healthy.remove(engine)
+
+    def check(self):
+        """
+        Health-checks all replicas (w/o holding the lock, s.t. pick() is not
+        blocked by unresponsive replicas).
+        """
+        healthy = [e for e in self.engines if self._is_healthy(e)]
+        if len(healthy) < len(self.engines):
+            _logger.warning('%d of %d replicas unavailable or lagging'
+                            % (len(self.engines) - len(healthy),
+                               len(self.engines)))
+        with self._lock:
+            self._healthy = healthy
+            self._checked = time.time()
+
+    def stop(self):
+        """
+        Stops the background health checks.
+        """
+        self._stopped.set()
+
+    def _start_checker(self):
+        pid = os.getpid()
+        if self._checker_pid == pid:
+            return
+        with self._lock:
+            if self._checker_pid == pid:
+                return
+            self._checker_pid = pid
+        checker = Thread(target=self._run_checks)
+        checker.daemon = True
+        checker.start()
+
+    def _run_checks(self):
+        while not self._stopped.is_set():
+            checked = self._checked
+            if checked is not None \
+               and time.time() - checked < self.check_interval:
+                self._stopped.wait(checked + self.check_interval
+                                   - time.time())
+                continue
+            try:
+                self.check()
+            except Exception:
+                _logger.exception('Replica health check failed')
+                self._stopped.wait(self.check_interval)
+
+    def _is_healthy(self, engine):
+        try:
+            status = engine.execute('SHOW SLAVE STATUS').first()
+        except Exception:
+            return False
+        if status is None:
+            # no replication status (e.g., a cluster node) - but reachable
+            return True
+        lag = status['Seconds_Behind_Master']
+        return lag is not None and lag <= self.max_lag
@@ -2,23 +2,55 @@ __author__ = 'omihelic, fbahr'
 
 # @[fbahr] - TODO: Imho, candidate for a major rewrite...
 
+import base64
 import calendar
 import datetime
 from datetime import datetime, timedelta
+import functools
+import hashlib
 import json
 import re
+import struct
+import time
 from giraffe.service.rest_server import Rest_Server
 import giraffe.service.db as db
 from giraffe.service.db import Host, Project, Meter, MeterRecord
+from giraffe.service.db import HourlyRollup, DailyRollup
+from giraffe.service.db import User, Instance, MeterPresence
 from giraffe.service.db import MIN_TIMESTAMP, MAX_TIMESTAMP,\
                                ORDER_ASC, ORDER_DESC
 
+from giraffe.common.cache import Cache
 from giraffe.common.config import Config
 _config = Config('giraffe.cfg')
 
 import logging
 _logger = logging.getLogger('service.rest_api')
 
+
+def _cached(route):
+    """
+    Decorates a route s.t. its JSON-formatted results are served from the
+    response cache (if enabled), keyed by route name, path IDs and the
+    normalized query params; streamed results are not cached.
+    """
+    @functools.wraps(route)
+    def wrapper(self, *args):
+        if self.cache is None:
+            return route(self, *args)
+        self._check_retention()
+        query = self._query_params(args[-1] if args else '')
+        key = (route.__name__, args[:-1], tuple(sorted(query.items())))
+        result = self.cache.get(key)
+        if result is None:
+            result = route(self, *args)
+            if isinstance(result, basestring) \
+               and len(result) <= self.cache_max_bytes:
+                self.cache.set(key, result, ttl=self._cache_ttl(query))
+        return result
+    return wrapper
+
+
 class Rest_API(object):
     def __init__(self):
         self.PARAM_START_TIME = 'start_time'
@@ -28,6 +60,27 @@ class Rest_API(object):
         self.PARAM_LIMIT = 'limit'
         self.PARAM_ORDER = 'order'
         self.PARAM_DETAILS = 'details'
+        self.PARAM_STREAM = 'stream'
+        self.PARAM_CURSOR = 'cursor'
+        self.PARAM_INTERVAL = 'interval'
+        self.PARAM_STATS = 'stats'
+        self.PARAM_METERS = 'meters'
+        self.PARAM_FORMAT = 'format'
+        self.CURSOR_FIRST = 'first'
+        # streamed results: a JSON array, or one JSON object per line
+        self.FORMAT_JSON = 'json'
+        self.FORMAT_NDJSON = 'ndjson'
+        # columnar results (see _columnar): JSON, or packed binary arrays
+        self.FORMAT_COLUMNAR = 'columnar'
+        self.FORMAT_PACKED = 'packed'
+        self.SERIES_KEYS = ('meter_id', 'host_id', 'resource_id',
+                            'project_id', 'user_id')
+        # time series: seconds per interval unit, and supported statistics
+        self.INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        self.STATS = ('min', 'max', 'avg', 'sum', 'count', 'last')
+        # version of the results' representation, part of their ETags (see
+        # validators): to be increased whenever it changes
+        self.API_VERSION = 1
         self.RESULT_LIMIT = 2500
         self.AGGREGATION_COUNT = 'count'
         self.AGGREGATION_MAX = 'max'
@@ -37,8 +90,55 @@ class Rest_API(object):
         self.AGGREGATION_DAILY_AVG = 'daily_avg'
         self.AGGREGATION_SUM = 'sum'
         self.AGGREGATION_FIRST_LAST = 'first_last'
+        # MeterRecord args that can be answered from rollup tables
+        self.ROLLUP_ARGS = set(['meter_id', 'host_id', 'resource_id',
+                                'project_id', 'timestamp'])
+        # batch queries (see route_query): MeterRecord columns per entity,
+        # query params a query may contain, and aggregations that are
+        # computed for many entities by a single GROUP BY query
+        self.BATCH_ENTITIES = {'host': 'host_id',
+                               'project': 'project_id',
+                               'user': 'user_id',
+                               'instance': 'resource_id'}
+        self.BATCH_PARAMS = (self.PARAM_START_TIME, self.PARAM_END_TIME,
+                             self.PARAM_AGGREGATION, self.PARAM_ORDER,
+                             self.PARAM_LIMIT, self.PARAM_INTERVAL,
+                             self.PARAM_STATS)
+        self.BATCH_MERGEABLE = (self.AGGREGATION_COUNT, self.AGGREGATION_SUM,
+                                self.AGGREGATION_AVG)
+        self.BATCH_LIMIT = 1000
         self.server = None
         self.db = None
+        # response cache: results for time windows that end before the
+        # ingest watermark (see _watermark) expire after cache_immutable_ttl
+        # seconds, others after cache_ttl seconds - and all of them once the
+        # retention cutoff moves (see _check_retention); cache_size = 0
+        # disables caching
+        cache_size = int(_config.get('rest_api', 'cache_size',
+                                     default=1000))
+        self.cache_ttl = float(_config.get('rest_api', 'cache_ttl',
+                                           default=30))
+        self.cache_immutable_ttl = float(_config.get('rest_api',
+                                                     'cache_immutable_ttl',
+                                                     default=86400))
+        self.cache_max_bytes = int(_config.get('rest_api', 'cache_max_bytes',
+                                               default=1048576))
+        self.cache = Cache(cache_size, self.cache_ttl) if cache_size else None
+        # records older than the watermark are expected to be collected;
+        # i.e., hosts' last activity minus a grace period for late records,
+        # where hosts not seen for HOST_TIMEOUT seconds are considered down
+        self.WATERMARK_GRACE = float(_config.get('rest_api', 'cache_grace',
+                                                 default=600))
+        self.HOST_TIMEOUT = 86400
+        self._watermark_state = (0, None)
+        # raw records older than RAW_DAYS days are expired by the collector's
+        # retention engine (0: kept forever)
+        self.RAW_DAYS = int(_config.get('retention', 'raw_days', default=0))
+        self._retention_state = None
+        # rollups are only read from their backfill point on (see
+        # _rollup_start), which is looked up every ROLLUP_START_TTL seconds
+        self.ROLLUP_START_TTL = 3600
+        self._rollup_start_state = {}
         self._param_patterns = {self.PARAM_START_TIME:
                                     re.compile('^(\d{4})-(\d{2})-(\d{2})_'
                                                '(\d{2})-(\d{2})-(\d{2})$'),
@@ -50,24 +150,54 @@ class Rest_API(object):
                                 self.PARAM_ORDER: re.compile('^(%s|%s)$' %\
                                                              (ORDER_ASC,
                                                               ORDER_DESC)),
-                                self.PARAM_DETAILS: re.compile('^\w+$'),}
+                                self.PARAM_DETAILS: re.compile('^\w+$'),
+                                self.PARAM_STREAM: re.compile('^\w+$'),
+                                self.PARAM_CURSOR: re.compile('^[\w-]+$'),
+                                self.PARAM_INTERVAL:
+                                    re.compile('^\d+[smhd]$'),
+                                self.PARAM_STATS:
+                                    re.compile('^\w+(,\w+)*$'),
+                                self.PARAM_METERS:
+                                    re.compile('^[\w.]+(,[\w.]+)*$'),
+                                self.PARAM_FORMAT: re.compile('^\w+$'),}
         self._param_defaults = {self.PARAM_START_TIME: None,
                                 self.PARAM_END_TIME: None,
                                 self.PARAM_AGGREGATION: None,
-                                self.PARAM_LIMIT: self.RESULT_LIMIT,
+                                self.PARAM_LIMIT: None,  # see _limit
                                 self.PARAM_ORDER: ORDER_ASC,
-                                self.PARAM_DETAILS: 'False'}
+                                self.PARAM_DETAILS: 'False',
+                                self.PARAM_STREAM: 'False',
+                                self.PARAM_CURSOR: None,
+                                self.PARAM_INTERVAL: None,
+                                self.PARAM_STATS: 'avg',
+                                self.PARAM_METERS: None,
+                                self.PARAM_FORMAT: self.FORMAT_JSON}
         self._pattern_timestamp = re.compile(
             '^(\d{4})-(\d{2})-(\d{2})_(\d{2})-(\d{2})-(\d{2})$')
 
     def launch(self):
         try:
-            self.db = db.connect('%s://%s:%s@%s/%s' % (
+            # (read-only) queries are routed to replicas, if configured
+            # as "replica_hosts = host_1, host_2, ..."
+            url = lambda host: '%s://%s:%s@%s/%s' % (
                 _config.get('db', 'vendor'),
                 _config.get('db', 'user'),
                 _config.get('db', 'pass'),
-                _config.get('db', 'host'),
-                _config.get('db', 'schema')))
+                host,
+                _config.get('db', 'schema'))
+            replica_hosts = _config.get('db', 'replica_hosts', default='')
+            # each thread (of each worker process) may hold a connection
+            threads = int(_config.get('rest_api', 'threads', default=1))
+            pool_options = db.pool_options(_config)
+            pool_options.setdefault('pool_size', max(5, threads))
+            self.db = db.connect(url(_config.get('db', 'host')),
+                                 replicas=[url(host.strip())
+                                           for host in replica_hosts.split(',')
+                                           if host.strip()],
+                                 max_lag=int(_config.get('db',
+                                                         'replica_max_lag',
+                                                         default=30)),
+                                 **pool_options)
 
             conf = dict(log_name='Auth',
                         auth_host=_config.get('rest_api', 'auth_host'),
@@ -79,6 +209,37 @@ class Rest_API(object):
                         rest_api=self,
                         host=_config.get('rest_api', 'host'),
                         port=_config.getint('rest_api', 'port'),
+                        threaded=_config.get('rest_api', 'threaded',
+                                             default='true').lower() == 'true',
+                        workers=int(_config.get('rest_api', 'workers',
+                                                default=0)),
+                        threads=threads,
+                        keepalive=int(_config.get('rest_api', 'keepalive',
+                                                  default=5)),
+                        timeout=int(_config.get('rest_api', 'timeout',
+                                                default=60)),
+                        graceful_timeout=int(_config.get('rest_api',
+                                                         'graceful_timeout',
+                                                         default=30)),
+                        max_requests=int(_config.get('rest_api',
+                                                     'max_requests',
+                                                     default=0)),
+                        token_cache_size=int(_config.get('rest_api',
+                                                         'token_cache_size',
+                                                         default=1000)),
+                        token_cache_ttl=int(_config.get('rest_api',
+                                                        'token_cache_ttl',
+                                                        default=300)),
+                        token_cache_negative_ttl=int(_config.get(
+                                                  'rest_api',
+                                                  'token_cache_negative_ttl',
+                                                  default=60)),
+                        metrics_hosts=[host.strip() for host in _config.get(
+                                           'rest_api', 'metrics_hosts',
+                                           default='127.0.0.1, ::1').split(',')
+                                       if host.strip()],
+                        metrics_dir=_config.get('rest_api', 'metrics_dir',
+                                                default=None),
                         )
 
             self.server = Rest_Server(conf)
@@ -86,7 +247,9 @@ class Rest_API(object):
 
         except KeyboardInterrupt:
             _logger.info("Ctrl-c received!")
-        except:
+        except Exception:
+            # ^note: SystemExit (e.g., gunicorn's arbiter shutting down) is
+            #        passed on to the caller
             _logger.exception("Error: Unable to start API service")
         finally:
             _logger.info("Shutdown API service")
@@ -120,7 +283,320 @@ class Rest_API(object):
                 continue
         return params
 
-    def _aggregate(self, cls, aggregation, args, column="value"):
+    def _limit(self, query):
+        """
+        Returns the "limit" query param, or RESULT_LIMIT if it is not given.
+        """
+        limit = query[self.PARAM_LIMIT]
+        return self.RESULT_LIMIT if limit is None else limit
+
+    def _cache_ttl(self, query):
+        """
+        Returns the ttl for caching a result for the given query params:
+        cache_immutable_ttl if it is immutable, cache_ttl otherwise.
+        """
+        return self.cache_immutable_ttl if self._immutable(query) \
+               else self.cache_ttl
+
+    def _retention_cutoff(self):
+        """
+        Returns the day before which raw records are expired by the
+        retention engine (see giraffe.service.retention), or None if they
+        are kept forever.
+        """
+        if not self.RAW_DAYS:
+            return None
+        now = datetime.now()
+        return datetime(now.year, now.month, now.day) \
+               - timedelta(days=self.RAW_DAYS)
+
+    def _check_retention(self):
+        """
+        Clears the response cache once the retention cutoff has moved, i.e.
+        when cached ("immutable") results may have changed.
+        """
+        cutoff = self._retention_cutoff()
+        if cutoff != self._retention_state:
+            if self._retention_state is not None:
+                self.cache.clear()
+            self._retention_state = cutoff
+
+    def _immutable(self, query):
+        """
+        Returns True if results for the given query params do not change
+        anymore, i.e. their time window ends before the ingest watermark.
+        """
+        end_time = query[self.PARAM_END_TIME]
+        watermark = self._watermark() if end_time else None
+        return watermark is not None \
+               and end_time < watermark.strftime('%Y-%m-%d %H:%M:%S')
+
+    def validators(self, path, query_string):
+        """
+        Returns a (strong) ETag and the Last-Modified datetime, i.e. the end
+        of the time window, for results of the given route if they are
+        immutable - computed w/o running the route's query; None otherwise.
+        Besides the route and query params, the ETag covers API_VERSION and
+        the retention cutoff, s.t. it changes along w/ the results when
+        either of them does.
+        """
+        query = self._query_params(query_string)
+        if not self._immutable(query):
+            return None
+        cutoff = self._retention_cutoff()
+        key = '%s?%s#%d/%s' % (path.rstrip('/'),
+                               '&'.join('%s=%s' % item
+                                        for item in sorted(query.items())),
+                               self.API_VERSION,
+                               cutoff.strftime('%Y-%m-%d') if cutoff else '')
+        return (hashlib.sha1(key.encode('utf-8')).hexdigest(),
+                datetime.strptime(query[self.PARAM_END_TIME],
+                                  '%Y-%m-%d %H:%M:%S'))
+
+    def _watermark(self):
+        """
+        Returns the ingest watermark, i.e. the oldest last activity of all
+        hosts active within HOST_TIMEOUT seconds of the latest one, minus
+        WATERMARK_GRACE seconds (or None if there are no hosts yet). Looked
+        up at most every cache_ttl seconds, in the current request's session
+        (which is left open, s.t. routes' objects are not detached).
+        """
+        checked, watermark = self._watermark_state
+        if time.time() - checked < self.cache_ttl:
+            return watermark
+        try:
+            latest = self.db.max(Host, 'activity')
+            if latest is not None:
+                since = latest - timedelta(seconds=self.HOST_TIMEOUT)
+                watermark = self.db.min(Host, 'activity',
+                                        {'activity': (since, None)}) \
+                            - timedelta(seconds=self.WATERMARK_GRACE)
+            self._watermark_state = (time.time(), watermark)
+        except Exception as e:
+            _logger.exception(e)
+        return watermark
+
+    def _streamed(self, query):
+        """
+        Returns True if results are to be streamed, i.e. for query params
+        "stream=true" or "format=ndjson".
+        """
+        return query[self.PARAM_STREAM].lower() == 'true' \
+               or query[self.PARAM_FORMAT] == self.FORMAT_NDJSON
+
+    def _stream(self, cls, args, query, order_attr='timestamp'):
+        """
+        Returns a generator yielding the JSON-formatted list of all objects
+        of the given class that match args - or, for query param
+        "format=ndjson", one JSON object per line - in chunks, s.t.
+        arbitrarily large results are served in constant memory.
+        Results are only limited if param "limit" is given explicitly.
+        """
+        limit = query[self.PARAM_LIMIT]
+        if query[self.PARAM_FORMAT] == self.FORMAT_NDJSON:
+            begin, delimiter, end = '', '\n', '\n'
+        else:
+            begin, delimiter, end = '[', ', ', ']'
+
+        def generate():
+            # runs after the request's session has been closed, i.e. w/ a
+            # session of its own
+            self.db.session_open()
+            try:
+                yield begin
+                chunk, separator = [], ''
+                for obj in self.db.iter_load(cls, args, limit=limit,
+                                             order=query[self.PARAM_ORDER],
+                                             order_attr=order_attr):
+                    chunk.append(json.dumps(obj.to_dict()))
+                    if len(chunk) == db.STREAM_CHUNK_SIZE:
+                        yield separator + delimiter.join(chunk)
+                        chunk, separator = [], delimiter
+                if chunk:
+                    yield separator + delimiter.join(chunk) + end
+                elif begin or separator:
+                    yield end
+            finally:
+                self.db.session_close()
+
+        return generate()
+
+    def _page(self, cls, args, query, order_attr='timestamp'):
+        """
+        Returns a JSON-formatted page of at most "limit" objects of the given
+        class that match args, as {"records": [...], "next": <cursor>} (query
+        param "cursor": "first", or the "next" cursor of the previous page;
+        "next" is null on the last page). Returns None for invalid cursors.
+        """
+        after = None
+        cursor = query[self.PARAM_CURSOR]
+        if cursor != self.CURSOR_FIRST:
+            try:
+                value, key = base64.urlsafe_b64decode(
+                                str(cursor) + '=' * (-len(cursor) % 4)).split('|')
+                if order_attr == 'timestamp':
+                    value = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+                after = (value, int(key))
+            except Exception:
+                return None
+
+        limit = max(1, int(self._limit(query)))
+        objs = self.db.load_page(cls, args, limit=limit + 1,
+                                 order=query[self.PARAM_ORDER],
+                                 order_attr=order_attr, after=after)
+        next_cursor = None
+        if len(objs) > limit:
+            objs = objs[:limit]
+            value = getattr(objs[-1], order_attr)
+            if isinstance(value, datetime):
+                value = value.strftime('%Y-%m-%d %H:%M:%S')
+            # ^note: padding is stripped, since '=' is not allowed in values
+            next_cursor = base64.urlsafe_b64encode(
+                              '%s|%s' % (value, objs[-1].id)).rstrip('=')
+        return json.dumps({'records': [o.to_dict() for o in objs],
+                           'next': next_cursor})
+
+    def _columnar(self, cls, args, query):
+        """
+        Returns the records of the given class that match args in a compact
+        format, {"meta": {<key>: <value>, ..}, "timestamps": [..], "values":
+        [..]}, w/ timestamps as seconds since the epoch, numeric values, and
+        series keys (see SERIES_KEYS) whose value is the same for all records
+        given once, as meta data - or as parallel arrays otherwise. Record
+        timestamps are naive UTC times, hence converted as such - i.e.,
+        datetime.utcfromtimestamp() returns the records' "timestamp".
+        For query param "format=packed", the arrays of timestamps and values
+        are not part of the JSON-formatted header (but its "count") and
+        follow it, after a newline, as little-endian 64-bit integers and
+        doubles (NaN for missing values).
+        """
+        columns = self.SERIES_KEYS + ('timestamp', 'numeric_value')
+        rows = self.db.load_columns(cls, columns,
+                                    args=args,
+                                    limit=self._limit(query),
+                                    order=query[self.PARAM_ORDER],
+                                    order_attr='timestamp')
+        result = {'meta': {}}
+        for i, key in enumerate(self.SERIES_KEYS):
+            values = [row[i] for row in rows]
+            if len(set(values)) == 1:
+                result['meta'][key] = values[0]
+            elif values:
+                result[key] = values
+        timestamps = [calendar.timegm(row[-2].timetuple()) for row in rows]
+        values = [float(row[-1]) if row[-1] is not None else None
+                  for row in rows]
+
+        if query[self.PARAM_FORMAT] != self.FORMAT_PACKED:
+            result['timestamps'] = timestamps
+            result['values'] = values
+            return json.dumps(result)
+        result['count'] = len(rows)
+        return '%s\n%s%s' % (json.dumps(result),
+                             struct.pack('<%dq' % len(rows), *timestamps),
+                             struct.pack('<%dd' % len(rows),
+                                         *[v if v is not None else float('nan')
+                                           for v in values]))
+
+    def _series(self, cls, args, query, column='numeric_value'):
+        """
+        Returns a JSON-formatted time series of statistics of "column" per
+        bucket of "interval" (query param, e.g. 5m, 1h, 1d) as parallel
+        arrays, {"interval": <seconds>, "timestamps": [<bucket start>, ..],
+        "<stat>": [..], ..}, for all statistics given by query param "stats"
+        (comma-separated: min, max, avg, sum, count, last); empty buckets
+        are left out. Returns None for unknown statistics.
+        """
+        result = self._series_data(cls, args, query, column)
+        return json.dumps(result) if result is not None else None
+
+    def _series_data(self, cls, args, query, column='numeric_value'):
+        """
+        Same as _series(), but returns the time series as a dict.
+        """
+        interval = query[self.PARAM_INTERVAL]
+        seconds = int(interval[:-1]) * self.INTERVAL_UNITS[interval[-1]]
+        stats = query[self.PARAM_STATS].split(',')
+        if not seconds or not set(stats).issubset(self.STATS):
+            return None
+
+        rollup_cls = self._aligned_rollup(cls, args, column, seconds)
+        if rollup_cls is not None:
+            rollup_args = dict((key, value) for key, value in args.items()
+                               if key != 'timestamp')
+            if 'timestamp' in args:
+                rollup_args['bucket'] = args['timestamp']
+            buckets = self.db.rollup_bucketed(rollup_cls, rollup_args,
+                                              seconds, stats)
+        else:
+            buckets = self.db.bucketed(cls, column, args, seconds, stats)
+
+        timestamps = sorted(buckets)
+        result = {'interval': seconds,
+                  'timestamps': [t.strftime('%Y-%m-%d %H:%M:%S')
+                                 for t in timestamps]}
+        for i, stat in enumerate(stats):
+            convert = int if stat == 'count' else float
+            result[stat] = [convert(buckets[t][i])
+                                if buckets[t][i] is not None else None
+                            for t in timestamps]
+        return result
+
+    def _aligned_rollup(self, cls, args, column, seconds):
+        """
+        Returns the (coarsest) rollup class an aggregation over buckets of
+        the given length can be computed from - i.e., whose buckets evenly
+        divide these buckets and the time range given by args, which starts
+        at or after the rollups' backfill point (see _rollup_start) - or None
+        if it has to be computed from meter records.
+        """
+        if cls is not MeterRecord or column != 'numeric_value' \
+           or not set(args).issubset(self.ROLLUP_ARGS):
+            return None
+        dt_format = "%Y-%m-%d %H:%M:%S"
+        lower, upper = args.get('timestamp', (None, None))
+        if lower in (None, MIN_TIMESTAMP):
+            return None
+        bounds = [datetime.strptime(lower, dt_format)]
+        if upper not in (None, MAX_TIMESTAMP):
+            bounds.append(datetime.strptime(upper, dt_format)
+                          + timedelta(seconds=1))
+        for rollup_cls in (DailyRollup, HourlyRollup):
+            if not seconds % rollup_cls.BUCKET_SECONDS \
+               and all(rollup_cls.bucket_of(b) == b for b in bounds) \
+               and self._covered_by_rollups(rollup_cls, bounds[0]):
+                return rollup_cls
+        return None
+
+    def _covered_by_rollups(self, rollup_cls, startdate):
+        """
+        Returns True if the rollups of the given class cover all meter
+        records from startdate on.
+        """
+        start = self._rollup_start(rollup_cls)
+        return start is not None and startdate >= start
+
+    def _rollup_start(self, rollup_cls):
+        """
+        Returns the backfill point of the given rollup class, i.e. the start
+        of its first complete bucket - the oldest bucket is partial if the
+        collector started maintaining rollups within it (and rollups have not
+        been rebuilt, see bin/db_rebuild_rollups.sh) - or None if there are
+        no rollups yet. Looked up at most every ROLLUP_START_TTL seconds.
+        """
+        checked, start = self._rollup_start_state.get(rollup_cls, (0, None))
+        if time.time() - checked < self.ROLLUP_START_TTL:
+            return start
+        try:
+            oldest = self.db.min(rollup_cls, 'bucket')
+            start = oldest + timedelta(seconds=rollup_cls.BUCKET_SECONDS) \
+                    if oldest is not None else None
+            self._rollup_start_state[rollup_cls] = (time.time(), start)
+        except Exception as e:
+            _logger.exception(e)
+        return start
+
+    def _aggregate(self, cls, aggregation, args, column='numeric_value'):
         """
         Returns an aggregation of an attribute of the given object class
         according to the 'aggregation' parameter:
@@ -159,32 +635,16 @@ class Rest_API(object):
                 enddate = enddate.replace(minute=59, second=59) \
                               if   enddate.minute or enddate.second \
                               else enddate - timedelta(seconds=1)
-                delta = enddate - startdate
-                hours = (delta.days * 24 * 3600 + delta.seconds) / 3600 + 1
-                result = []
-                for h in range(0, hours):
-                    query_startdate = startdate + timedelta(seconds=h * 3600)
-                    query_enddate = enddate - timedelta(seconds=(hours - h - 1) * 3600)
-                    args['timestamp'] = (query_startdate.strftime(dt_format),
-                                         query_enddate.strftime(dt_format))
-                    result.append(self.db.avg(cls, column, args))
-                return result
+                return self._bucket_avgs(cls, HourlyRollup, args, column,
+                                         startdate, enddate)
             elif aggregation == self.AGGREGATION_DAILY_AVG:
                 dt_format = "%Y-%m-%d %H:%M:%S"
                 strptime = lambda x: datetime.strptime(x, dt_format)
                 startdate, enddate = map(strptime, args['timestamp'])
                 startdate = startdate.replace(hour=0, minute=0, second=0)
                 enddate = enddate.replace(hour=23, minute=59, second=59)
-                delta = enddate - startdate
-                days = (delta.days if delta.days <= 31 else 30) + 1
-                result = []
-                for d in range(0, days):
-                    query_startdate = startdate + timedelta(days=d)
-                    query_enddate = enddate - timedelta(days=(delta.days - d))
-                    args['timestamp'] = (query_startdate.strftime(dt_format),
-                                         query_enddate.strftime(dt_format))
-                    result.append(self.db.avg(cls, column, args))
-                return result
+                return self._bucket_avgs(cls, DailyRollup, args, column,
+                                         startdate, enddate)
             elif aggregation == self.AGGREGATION_SUM:
                 value_sum = self.db.sum(cls, column, args)
                 return float(value_sum) if value_sum else 0.0
@@ -199,6 +659,50 @@ class Rest_API(object):
             _logger.exception(e)
         return None
 
+    def _bucket_avgs(self, cls, rollup_cls, args, column, startdate,
+                     enddate):
+        """
+        Returns the list of averages of "column" per bucket of the given
+        rollup class (hour or day) from startdate to enddate, None for
+        buckets w/o values; read from the rollup table if possible, or
+        computed by a single GROUP BY query otherwise.
+        """
+        seconds = rollup_cls.BUCKET_SECONDS
+        avgs = self._rollup_avgs(cls, rollup_cls, args, column,
+                                 startdate, enddate)
+        if avgs is None:
+            dt_format = "%Y-%m-%d %H:%M:%S"
+            args = dict(args, timestamp=(startdate.strftime(dt_format),
+                                         enddate.strftime(dt_format)))
+            avgs = dict((bucket, values[0]) for (bucket, values)
+                        in self.db.bucketed(cls, column, args, seconds,
+                                            ('avg',),
+                                            origin=startdate).items())
+        delta = enddate - startdate
+        buckets = (delta.days * 86400 + delta.seconds) / seconds + 1
+        avgs = [avgs.get(startdate + timedelta(seconds=b * seconds))
+                for b in range(0, buckets)]
+        return [float(avg) if avg is not None else None for avg in avgs]
+
+    def _rollup_avgs(self, cls, rollup_cls, args, column, startdate, enddate):
+        """
+        Returns a dict of bucket/average-pairs for MeterRecord values between
+        startdate and enddate, read from the given rollup table - or None if
+        the args cannot be answered from rollups (e.g., user_id), or the
+        rollups do not cover startdate (see _rollup_start).
+        """
+        if cls is not MeterRecord or column != 'numeric_value' \
+           or not set(args).issubset(self.ROLLUP_ARGS) \
+           or not self._covered_by_rollups(rollup_cls, startdate):
+            return None
+        dt_format = "%Y-%m-%d %H:%M:%S"
+        rollup_args = dict((key, value) for key, value in args.items()
+                           if key != 'timestamp')
+        rollup_args['bucket'] = (startdate.strftime(dt_format),
+                                 enddate.strftime(dt_format))
+        return self.db.rollup_avg(rollup_cls, rollup_args)
+
+    @_cached
     def route_root(self, query_string=''):
         """
         Route: /
@@ -207,6 +711,7 @@ class Rest_API(object):
         """
         return json.dumps('Welcome to Giraffe REST API')
 
+    @_cached
     def route_hosts(self, query_string=''):
         """
         Returns a list of all available Host objects.
@@ -238,6 +743,7 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(result)
 
+    @_cached
     def route_hosts_hid(self, host_id, query_string):
         """
         Returns the Host object where the host_id matches.
@@ -263,6 +769,7 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(host) if host else None
 
+    @_cached
     def route_hosts_hid_meters(self, host_id, query_string):
         """
         Returns a list of Meter objects for which MeterRecords are available
@@ -286,10 +793,12 @@ class Rest_API(object):
             return None
 
         try:
-            meter_ids = self.db.distinct_values(cls=MeterRecord,
-                                                column='meter_id',
-                                                args={'host_id': host.id},
-                                                order=ORDER_ASC)
+            meter_ids = self.db.distinct_values(
+                                cls=MeterPresence,
+                                column='meter_id',
+                                args={'entity': MeterPresence.ENTITY_HOST,
+                                      'entity_id': str(host.id)},
+                                order=ORDER_ASC)
             meters = self.db.load(cls=Meter,
                                   args={'id': meter_ids})
             result = [m.to_dict() for m in meters]
@@ -300,6 +809,7 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(result)
 
+    @_cached
     def route_hosts_hid_meters_mid_records(self, host_id, meter_id,
                                            query_string):
         """
@@ -308,7 +818,9 @@ class Rest_API(object):
 
         Route: hosts/<host_id>/meters/<meter_id>/
         Returns: List of MeterRecord objects, JSON-formatted
-        Query params: start_time, end_time, aggregation, order, limit
+        Query params: start_time, end_time, aggregation, order, limit, stream,
+                      format (json, ndjson, columnar, packed), cursor,
+                      interval, stats
         """
         query = self._query_params(query_string)
         try:
@@ -341,7 +853,7 @@ class Rest_API(object):
         if query[self.PARAM_AGGREGATION]:
             column = 'timestamp' if   query[self.PARAM_AGGREGATION] \
                                       == self.AGGREGATION_FIRST_LAST \
-                                 else 'value'
+                                 else 'numeric_value'
             try:
                 result = self._aggregate(cls=MeterRecord,
                                          aggregation=query[self.PARAM_AGGREGATION],
@@ -352,23 +864,43 @@ class Rest_API(object):
                 result = [] if   query[self.PARAM_AGGREGATION] \
                                  == self.AGGREGATION_FIRST_LAST \
                             else 0
+            result = json.dumps(result)
+
+        # time series (no aggregation)
+        elif query[self.PARAM_INTERVAL]:
+            result = self._series(MeterRecord, record_args, query)
+
+        # paging (no aggregation)
+        elif query[self.PARAM_CURSOR]:
+            result = self._page(MeterRecord, record_args, query)
+
+        # streaming (no aggregation)
+        elif self._streamed(query):
+            result = self._stream(MeterRecord, record_args, query)
+
+        # columnar (no aggregation)
+        elif query[self.PARAM_FORMAT] in (self.FORMAT_COLUMNAR,
+                                          self.FORMAT_PACKED):
+            result = self._columnar(MeterRecord, record_args, query)
 
         # no aggregation
         else:
             try:
                 records = self.db.load(cls=MeterRecord,
                                        args=record_args,
-                                       limit=query[self.PARAM_LIMIT],
+                                       limit=self._limit(query),
                                        order=query[self.PARAM_ORDER],
                                        order_attr='timestamp')
                 result = [r.to_dict() for r in records]
 
             except Exception:
                 result = []
+            result = json.dumps(result)
 
         self.db.session_close()
-        return json.dumps(result)
+        return result
 
+    @_cached
     def route_projects(self, query_string=''):
         """
         Returns a list of all Project objects.
@@ -397,15 +929,13 @@ class Rest_API(object):
                 if query[self.PARAM_DETAILS].lower() == 'true':
                     for p in projects:
                         try:
-                            instances = self.db.distinct_values( \
-                                                    cls=MeterRecord,
-                                                    column='resource_id',
-                                                    args={'project_id': p.uuid})
+                            num_instances = self.db.count(Instance,
+                                                {'project_id': p.uuid})
                         except Exception:
-                            instances = []
+                            num_instances = 0
                         finally:
                             setattr(p, 'details',
-                                       {'num_instances': len(instances)})
+                                       {'num_instances': num_instances})
 
                 result = [p.to_dict() for p in projects]
             except Exception:
@@ -414,6 +944,7 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(result)
 
+    @_cached
     def route_projects_pid(self, project_id, query_string=''):
         """
         Returns the Project object where the project_id matches.
@@ -435,6 +966,7 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(project) if project else None
 
+    @_cached
     def route_projects_pid_meters(self, project_id, query_string=''):
         """
         Returns a list of Meter objects for which MeterRecords are available
@@ -448,9 +980,11 @@ class Rest_API(object):
         self.db.session_open()
 
         try:
-            meter_ids = self.db.distinct_values(MeterRecord, 'meter_id',
-                                                args={'project_id': project_id},
-                                                order=ORDER_ASC)
+            meter_ids = self.db.distinct_values(
+                                MeterPresence, 'meter_id',
+                                args={'entity': MeterPresence.ENTITY_PROJECT,
+                                      'entity_id': project_id},
+                                order=ORDER_ASC)
             meters = self.db.load(Meter, args={'id': meter_ids})
             result = [m.to_dict() for m in meters]
 
@@ -460,12 +994,77 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(result)
 
+    @_cached
+    def route_projects_pid_usage(self, project_id, query_string=''):
+        """
+        Returns the usage of all instances of the given project per
+        cumulative meter, i.e. the sum of the differences of the instances'
+        last and first values within the given time range - computed by a
+        single query, from rollups if the time range is aligned to days (or
+        hours).
+
+        Route: projects/<project_id>/usage/
+        Returns: Dict of meter name/usage-pairs, JSON-formatted
+        Query params: start_time, end_time, meters (comma-separated meter
+                      IDs or names; default: all cumulative meters)
+        """
+        query = self._query_params(query_string)
+        self.db.session_open()
+
+        meters = self.db.load(Meter, {'type': 'cumulative'})
+        if query[self.PARAM_METERS]:
+            names = query[self.PARAM_METERS].split(',')
+            meters = [m for m in meters
+                      if m.name in names or str(m.id) in names]
+        if not meters:
+            self.db.session_close()
+            return json.dumps({})
+
+        args = {'project_id': project_id,
+                'meter_id': [m.id for m in meters]}
+        if query[self.PARAM_START_TIME] or query[self.PARAM_END_TIME]:
+            args['timestamp'] = (query[self.PARAM_START_TIME]
+                                     if   query[self.PARAM_START_TIME]
+                                     else MIN_TIMESTAMP,
+                                 query[self.PARAM_END_TIME]
+                                     if   query[self.PARAM_END_TIME]
+                                     else MAX_TIMESTAMP)
+        try:
+            rollup_cls = self._aligned_rollup(MeterRecord, args,
+                                              'numeric_value', 86400)
+            if rollup_cls is not None:
+                rollup_args = dict((key, value) for key, value in args.items()
+                                   if key != 'timestamp')
+                if 'timestamp' in args:
+                    rollup_args['bucket'] = args['timestamp']
+                values = self.db.first_last(rollup_cls,
+                                            ('meter_id', 'resource_id'),
+                                            rollup_args)
+            else:
+                values = self.db.first_last(MeterRecord,
+                                            ('meter_id', 'resource_id'),
+                                            args)
+            totals = dict((m.id, 0.0) for m in meters)
+            for (meter_id, _), (first, last) in values.items():
+                if first is not None and last is not None:
+                    totals[meter_id] += float(last) - float(first)
+            result = dict((m.name, totals[m.id]) for m in meters)
+        except Exception as e:
+            _logger.exception(e)
+            result = None
+
+        self.db.session_close()
+        return json.dumps(result) if result is not None else None
+
+    @_cached
     def route_projects_pid_meters_mid_records(self, project_id, meter_id,
                                               query_string=''):
         """
         Route: projects/<project_id>/meters/<meter_id>/records/
         Returns: List of MeterRecord objects, JSON-formatted
-        Query params: start_time, end_time, aggregation, order, limit
+        Query params: start_time, end_time, aggregation, order, limit, stream,
+                      format (json, ndjson, columnar, packed), cursor,
+                      interval, stats
         """
         query = self._query_params(query_string)
         self.db.session_open()
@@ -490,7 +1089,7 @@ class Rest_API(object):
                                          if   query[self.PARAM_END_TIME]
                                          else MAX_TIMESTAMP)
             if query[self.PARAM_AGGREGATION]:
-                column = 'value'
+                column = 'numeric_value'
                 if query[self.PARAM_AGGREGATION] == \
                                                    self.AGGREGATION_FIRST_LAST:
                     column = 'timestamp'
@@ -499,18 +1098,29 @@ class Rest_API(object):
                                          args=args,
                                          column=column)
                 result = json.dumps(result)
+            elif query[self.PARAM_INTERVAL]:
+                result = self._series(MeterRecord, args, query)
+            elif query[self.PARAM_CURSOR]:
+                result = self._page(MeterRecord, args, query)
+            elif self._streamed(query):
+                result = self._stream(MeterRecord, args, query)
+            elif query[self.PARAM_FORMAT] in (self.FORMAT_COLUMNAR,
+                                              self.FORMAT_PACKED):
+                result = self._columnar(MeterRecord, args, query)
             else:
                 records = self.db.load(MeterRecord, args,
-                                       limit=query[self.PARAM_LIMIT],
+                                       limit=self._limit(query),
                                        order=query[self.PARAM_ORDER],
                                        order_attr='timestamp')
                 result = json.dumps([r.to_dict() for r in records])
         self.db.session_close()
         return result
 
+    @_cached
     def route_projects_pid_instances(self, project_id, query_string=''):
         """
-        Returns a list of instance IDs for the given project.
+        Returns a list of instance IDs for the given project - if start_time
+        and/or end_time are given, of instances w/ records in that range.
 
         Route: projects/<project_id>/instances/
         Returns: List of Strings, JSON-formatted
@@ -519,17 +1129,22 @@ class Rest_API(object):
         query = self._query_params(query_string)
         args = {'project_id': project_id}
         if query[self.PARAM_START_TIME] or query[self.PARAM_END_TIME]:
+            # ^note: read from meter records, since the instance table only
+            #        knows when an instance was seen first and last
+            cls, column = MeterRecord, 'resource_id'
             args['timestamp'] = (query[self.PARAM_START_TIME]
                                      if   query[self.PARAM_START_TIME]
                                      else MIN_TIMESTAMP,
                                  query[self.PARAM_END_TIME]
                                      if   query[self.PARAM_END_TIME]
                                      else MAX_TIMESTAMP)
+        else:
+            cls, column = Instance, 'uuid'
         self.db.session_open()
 
         try:
-            instances = self.db.distinct_values(cls=MeterRecord,
-                                                column='resource_id',
+            instances = self.db.distinct_values(cls=cls,
+                                                column=column,
                                                 args=args,
                                                 order=ORDER_ASC)
 
@@ -543,6 +1158,7 @@ class Rest_API(object):
         else:
             return json.dumps(instances)
 
+    @_cached
     def route_meters(self, query_string=''):
         """
         Route: meters/
@@ -564,6 +1180,7 @@ class Rest_API(object):
         self.db.session_close()
         return result
 
+    @_cached
     def route_meters_mid(self, meter_id, query_string=''):
         """
         Returns a Meter object. The meter_id can either be the ID or the NAME.
@@ -587,6 +1204,7 @@ class Rest_API(object):
         self.db.session_close()
         return json.dumps(meter) if meter else None
 
+    @_cached
     def route_users(self, query_string=''):
         """
         Route: users/
@@ -595,27 +1213,26 @@ class Rest_API(object):
         """
         query = self._query_params(query_string)
         self.db.session_open()
-        values = self.db.distinct_values(cls=MeterRecord,
-                                         column='user_id',
-                                         order=query[self.PARAM_ORDER])
-        self.db.session_close()
-
-        # remove null values
-        values.remove(None)
 
-        # do count aggregation
-        # note: this is a work-around until User objects are available
         if query[self.PARAM_AGGREGATION] == self.AGGREGATION_COUNT:
-            return json.dumps(str(len(values)))
+            result = str(self.db.count(User))
         else:
-            return json.dumps(values)
+            result = self.db.distinct_values(cls=User,
+                                             column='uuid',
+                                             order=query[self.PARAM_ORDER])
 
+        self.db.session_close()
+        return json.dumps(result)
+
+    @_cached
     def route_users_uid_meters_mid_records(self, user_id, meter_id,
                                            query_string=''):
         """
         Route: users/<user_id>/meters/<meter_id>/records/
         Returns: List of MeterRecord objects, JSON-formatted
-        Query params: start_time, end_time, aggregation, order, limit
+        Query params: start_time, end_time, aggregation, order, limit, stream,
+                      format (json, ndjson, columnar, packed), cursor,
+                      interval, stats
         """
         query = self._query_params(query_string)
         self.db.session_open()
@@ -642,22 +1259,32 @@ class Rest_API(object):
             if query[self.PARAM_AGGREGATION]:
                 column = 'timestamp' if   query[self.PARAM_AGGREGATION] \
                                           == self.AGGREGATION_FIRST_LAST \
-                                     else 'value'
+                                     else 'numeric_value'
                 result = self._aggregate(cls=MeterRecord,
                                          aggregation=query[self.PARAM_AGGREGATION],
                                          args=args,
                                          column=column)
                 result = json.dumps(result)
+            elif query[self.PARAM_INTERVAL]:
+                result = self._series(MeterRecord, args, query)
+            elif query[self.PARAM_CURSOR]:
+                result = self._page(MeterRecord, args, query)
+            elif self._streamed(query):
+                result = self._stream(MeterRecord, args, query)
+            elif query[self.PARAM_FORMAT] in (self.FORMAT_COLUMNAR,
+                                              self.FORMAT_PACKED):
+                result = self._columnar(MeterRecord, args, query)
             else:
                 records = self.db.load(cls=MeterRecord,
                                        args=args,
-                                       limit=query[self.PARAM_LIMIT],
+                                       limit=self._limit(query),
                                        order=query[self.PARAM_ORDER],
                                        order_attr='timestamp')
                 result = json.dumps([r.to_dict() for r in records])
         self.db.session_close()
         return result
 
+    @_cached
     def route_instances(self, query_string=''):
         """
         Route: instances/
@@ -668,30 +1295,29 @@ class Rest_API(object):
         self.db.session_open()
 
         try:
-            instances = self.db.distinct_values(cls=MeterRecord,
-                                                column='resource_id',
-                                                order=query[self.PARAM_ORDER])
+            if query[self.PARAM_AGGREGATION] == self.AGGREGATION_COUNT:
+                result = self.db.count(Instance)
+            else:
+                result = self.db.distinct_values(cls=Instance,
+                                                 column='uuid',
+                                                 order=query[self.PARAM_ORDER])
         except Exception:
-            instances = []
+            result = 0 if    query[self.PARAM_AGGREGATION] \
+                             == self.AGGREGATION_COUNT \
+                       else []
 
         self.db.session_close()
+        return json.dumps(result)
 
-        # remove null values
-        instances.remove(None)
-
-        # do count aggregation
-        # note: this is a work-around until Instance objects are available < ?!
-        if query[self.PARAM_AGGREGATION] == self.AGGREGATION_COUNT:
-            return json.dumps(len(instances))
-        else:
-            return json.dumps(instances)
-
+    @_cached
     def route_instances_iid_meters_mid_records(self, instance_id, meter_id,
                                                query_string=''):
         """
         Route: instances/<instance_id>/meters/<meter_id>/records/
         Returns: List of MeterRecord objects, JSON-formatted
-        Query params: start_time, end_time, aggregation, order, limit
+        Query params: start_time, end_time, aggregation, order, limit, stream,
+                      format (json, ndjson, columnar, packed), cursor,
+                      interval, stats
         """
         query = self._query_params(query_string)
         self.db.session_open()
@@ -718,29 +1344,41 @@ class Rest_API(object):
             if query[self.PARAM_AGGREGATION]:
                 column = 'timestamp' if   query[self.PARAM_AGGREGATION] \
                                           == self.AGGREGATION_FIRST_LAST \
-                                     else 'value'
+                                     else 'numeric_value'
                 result = self._aggregate(cls=MeterRecord,
                                          aggregation=query[self.PARAM_AGGREGATION],
                                          args=args,
                                          column=column)
                 result = json.dumps(result)
+            elif query[self.PARAM_INTERVAL]:
+                result = self._series(MeterRecord, args, query)
+            elif query[self.PARAM_CURSOR]:
+                result = self._page(MeterRecord, args, query)
+            elif self._streamed(query):
+                result = self._stream(MeterRecord, args, query)
+            elif query[self.PARAM_FORMAT] in (self.FORMAT_COLUMNAR,
+                                              self.FORMAT_PACKED):
+                result = self._columnar(MeterRecord, args, query)
             else:
                 records = self.db.load(cls=MeterRecord,
                                        args=args,
-                                       limit=query[self.PARAM_LIMIT],
+                                       limit=self._limit(query),
                                        order=query[self.PARAM_ORDER],
                                        order_attr='timestamp')
                 result = json.dumps([r.to_dict() for r in records])
         self.db.session_close()
         return result
 
+    @_cached
     def route_records(self, query_string=''):
         """
         Returns a list of MeterRecord objects.
 
         Route: records/
         Returns: List of MeterRecord objects, JSON-formatted
-        Query params: start_time, end_time, aggregation, order, limit
+        Query params: start_time, end_time, aggregation, order, limit, stream,
+                      format (json, ndjson, columnar, packed), cursor,
+                      interval, stats
         """
         args = {}
         query = self._query_params(query_string)
@@ -758,16 +1396,26 @@ class Rest_API(object):
                                      aggregation=query[self.PARAM_AGGREGATION],
                                      args=args)
             result = json.dumps(result)
+        elif query[self.PARAM_INTERVAL]:
+            result = self._series(MeterRecord, args, query)
+        elif query[self.PARAM_CURSOR]:
+            result = self._page(MeterRecord, args, query)
+        elif self._streamed(query):
+            result = self._stream(MeterRecord, args, query)
+        elif query[self.PARAM_FORMAT] in (self.FORMAT_COLUMNAR,
+                                          self.FORMAT_PACKED):
+            result = self._columnar(MeterRecord, args, query)
         else:
             records = self.db.load(cls=MeterRecord,
                                    args=args,
-                                   limit=query[self.PARAM_LIMIT],
+                                   limit=self._limit(query),
                                    order=query[self.PARAM_ORDER],
                                    order_attr='timestamp')
             result = json.dumps([r.to_dict() for r in records])
         self.db.session_close()
         return result
 
+    @_cached
     def route_records_rid(self, record_id, query_string=''):
         """
         Returns a MeterRecord object.
@@ -790,3 +1438,150 @@ class Rest_API(object):
 
         self.db.session_close()
         return json.dumps(record) if record else None
+
+    def route_cache(self, query_string=''):
+        """
+        Returns statistics of the response cache.
+
+        Route: cache/
+        Returns: Dict of size, max_size, hits, misses and watermark (i.e.,
+                 results for time windows ending before are cached for
+                 cache_immutable_ttl seconds), JSON-formatted - or null if
+                 caching is disabled
+        Query params: -
+        """
+        if self.cache is None:
+            return json.dumps(None)
+        watermark = self._watermark_state[1]
+        return json.dumps({'size': len(self.cache),
+                           'max_size': self.cache.max_size,
+                           'hits': self.cache.hits,
+                           'misses': self.cache.misses,
+                           'watermark': watermark.strftime('%Y-%m-%d %H:%M:%S')
+                                            if watermark else None})
+
+    def route_query(self, body):
+        """
+        Runs a batch of queries for meter records of many entities and
+        meters in a single database session; count, sum, and avg queries
+        that only differ in their entity are answered by a single GROUP BY
+        query.
+
+        Route: query/ (POST)
+        Body: List of queries, JSON-formatted, e.g.
+              [{"entity": "instance", "id": "<uuid>", "meter": "<id|name>",
+                "start_time": "2013-01-01_00-00-00", "aggregation": "sum"},
+               ..]
+              w/ entity host (id or name), project, user, or instance, and
+              the query params of the records routes: start_time, end_time,
+              aggregation, order, limit, interval, stats
+        Returns: List of results (as returned by the records routes; null
+                 for invalid queries), in order, JSON-formatted - or None if
+                 the body is invalid
+        """
+        try:
+            specs = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(specs, list) or len(specs) > self.BATCH_LIMIT:
+            return None
+        self.db.session_open()
+
+        meters = {}
+        for m in self.db.load(Meter):
+            meters[str(m.id)] = meters[m.name] = m.id
+        hosts = {}
+
+        results = [None] * len(specs)
+        merged = {}
+        for i, spec in enumerate(specs):
+            try:
+                column, args, query = self._batch_args(spec, meters, hosts)
+            except ValueError:
+                # invalid query (e.g., unknown entity or meter): null
+                continue
+            try:
+                aggregation = query[self.PARAM_AGGREGATION]
+                if aggregation in self.BATCH_MERGEABLE:
+                    key = (column, aggregation,
+                           tuple(sorted(item for item in args.items()
+                                        if item[0] != column)))
+                    merged.setdefault(key, []).append((i, args[column]))
+                elif aggregation:
+                    results[i] = self._aggregate(
+                        MeterRecord, aggregation, args,
+                        'timestamp' if   aggregation \
+                                         == self.AGGREGATION_FIRST_LAST \
+                                    else 'numeric_value')
+                elif query[self.PARAM_INTERVAL]:
+                    results[i] = self._series_data(MeterRecord, args, query)
+                else:
+                    records = self.db.load(cls=MeterRecord,
+                                           args=args,
+                                           limit=self._limit(query),
+                                           order=query[self.PARAM_ORDER],
+                                           order_attr='timestamp')
+                    results[i] = [r.to_dict() for r in records]
+            except Exception as e:
+                _logger.exception(e)
+                continue
+
+        for (column, aggregation, other_args), members in merged.items():
+            args = dict(other_args)
+            args[column] = list(set(value for (_, value) in members))
+            count = aggregation == self.AGGREGATION_COUNT
+            try:
+                values = self.db.grouped(MeterRecord,
+                                         'id' if count else 'numeric_value',
+                                         column, args, (aggregation,))
+            except Exception as e:
+                _logger.exception(e)
+                continue
+            for (i, value) in members:
+                value = values.get(value, (None,))[0]
+                results[i] = (int(value) if count else float(value)) \
+                                 if value else (0 if count else 0.0)
+
+        self.db.session_close()
+        return json.dumps(results)
+
+    def _batch_args(self, spec, meters, hosts):
+        """
+        Returns the MeterRecord column of a batch query's entity, the
+        query's args (see Db.load), and its query params; raises a ValueError
+        if the query is invalid (other exceptions, e.g. database errors, are
+        passed on).
+        """
+        try:
+            column = self.BATCH_ENTITIES[spec['entity']]
+            meter_id = meters[str(spec['meter'])]
+            entity_id = spec['id']
+            query = self._query_params('&'.join(['%s=%s' % (key, spec[key])
+                                                 for key in self.BATCH_PARAMS
+                                                 if spec.get(key) is not None]))
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError('Invalid query: %r' % (spec, ))
+        if not isinstance(entity_id, (basestring, int, long)):
+            raise ValueError('Invalid id: %r' % (entity_id, ))
+        if column == 'host_id':
+            if entity_id not in hosts:
+                try:
+                    host_args = {'id': int(entity_id)}
+                except (TypeError, ValueError):
+                    host_args = {'name': entity_id}
+                host = self.db.load(Host, args=host_args, limit=1)
+                if not host:
+                    raise ValueError('Unknown host: %r' % (entity_id, ))
+                hosts[entity_id] = host[0].id
+            entity_id = hosts[entity_id]
+
+        args = {'meter_id': meter_id,
+                column: entity_id}
+        if query[self.PARAM_START_TIME] or query[self.PARAM_END_TIME]:
+            args['timestamp'] = (query[self.PARAM_START_TIME]
+                                     if   query[self.PARAM_START_TIME]
+                                     else MIN_TIMESTAMP,
+                                 query[self.PARAM_END_TIME]
+                                     if   query[self.PARAM_END_TIME]
+                                     else MAX_TIMESTAMP)
+        return column, args, query
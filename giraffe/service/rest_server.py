@@ -1,6 +1,10 @@
 import logging
+import os
+import tempfile
 import keystone.middleware.auth_token as auth_token
-from flask import Flask, Response, request
+from flask import Flask, Response, g, request
+from giraffe.service.metrics import Metrics, ROUTE
+from giraffe.service.token_cache import TokenCache
 
 logger = logging.getLogger('service.rest_server')
 
@@ -8,7 +12,84 @@ logger = logging.getLogger('service.rest_server')
 class Rest_Server():
 
     def start(self):
-        self.app.run(self.host, self.port)
+        if self.workers:
+            try:
+                self._start_workers()
+                return
+            except ImportError:
+                logger.warning('gunicorn is not installed, falling back to '
+                               'the development server')
+        self.app.run(self.host, self.port, threaded=self.threaded)
+
+    def _start_workers(self):
+        """
+        Serves the app by gunicorn, w/ "workers" processes of "threads"
+        threads each (SIGHUP reloads the workers gracefully, SIGTERM shuts
+        them down gracefully); each worker process opens database
+        connections of its own, and metrics are shared by all workers via
+        metrics_dir (a temporary directory, if not set). Raises SystemExit
+        when the arbiter exits (w/ code 0 on shutdown).
+        """
+        from gunicorn.app.base import BaseApplication
+
+        server = self
+        self.metrics.share(self.metrics_dir
+                           or tempfile.mkdtemp(prefix='giraffe-metrics-'))
+
+        def post_fork(arbiter, worker):
+            if server.rest_api.db is not None:
+                server.rest_api.db.dispose()
+
+        options = {'bind': '%s:%s' % (self.host, self.port),
+                   'workers': self.workers,
+                   'threads': self.threads,
+                   'worker_class': 'gthread' if self.threads > 1 else 'sync',
+                   'keepalive': self.keepalive,
+                   'timeout': self.timeout,
+                   'graceful_timeout': self.graceful_timeout,
+                   'max_requests': self.max_requests,
+                   'max_requests_jitter': self.max_requests / 10,
+                   'post_fork': post_fork}
+
+        class Application(BaseApplication):
+
+            def load_config(self):
+                for key, value in options.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return server.app
+
+        master = os.getpid()
+        try:
+            Application().run()
+        except SystemExit as e:
+            # the arbiter, as well as every worker, exits this way - but
+            # workers (forked by the arbiter) must not return into the
+            # master's code
+            if os.getpid() != master:
+                os._exit(e.code if isinstance(e.code, int)
+                         else 1 if e.code else 0)
+            raise
+
+    def _metrics_app(self, app):
+        """
+        Returns a WSGI application serving /metrics (in Prometheus text
+        format) to metrics_hosts, and passing all other requests to app.
+        """
+        def metrics_app(environ, start_response):
+            if environ.get('PATH_INFO', '').rstrip('/') != '/metrics':
+                return app(environ, start_response)
+            if environ.get('REMOTE_ADDR') not in self.metrics_hosts:
+                start_response('403 Forbidden',
+                               [('Content-Type', 'text/plain')])
+                return ['metrics are served to local clients only']
+            body = self.metrics.render()
+            start_response('200 OK',
+                           [('Content-Type', 'text/plain; version=0.0.4'),
+                            ('Content-Length', str(len(body)))])
+            return [body]
+        return metrics_app
 
     def __init__(self, conf):
         self.app = Flask(__name__)
@@ -16,9 +97,91 @@ class Rest_Server():
         self.rest_api = conf.get('rest_api')
         self.host = conf.get('host')
         self.port = conf.get('port')
+        self.threaded = conf.get('threaded', False)
+        # production serving by gunicorn (see _start_workers), unless
+        # workers = 0
+        self.workers = conf.get('workers', 0)
+        self.threads = conf.get('threads', 1)
+        self.keepalive = conf.get('keepalive', 5)
+        self.timeout = conf.get('timeout', 60)
+        self.graceful_timeout = conf.get('graceful_timeout', 30)
+        self.max_requests = conf.get('max_requests', 0)
 
         self.request = None
-        self.app.wsgi_app = auth_token.AuthProtocol(self.app.wsgi_app, conf)
+        # per-route metrics of all requests that pass authentication (incl.
+        # those failing w/ an exception, see Metrics.middleware)
+        self.metrics = Metrics()
+        if self.rest_api.db is not None:
+            self.metrics.instrument(self.rest_api.db)
+        self.app.wsgi_app = self.metrics.middleware(self.app.wsgi_app)
+
+        # validated tokens are cached, s.t. Keystone is not asked again
+        self.app.wsgi_app = TokenCache(self.app.wsgi_app,
+                                       lambda app: auth_token.AuthProtocol(
+                                                       app, conf),
+                                       max_size=conf.get('token_cache_size',
+                                                         1000),
+                                       ttl=conf.get('token_cache_ttl', 300),
+                                       negative_ttl=conf.get(
+                                           'token_cache_negative_ttl', 60))
+
+        # metrics are served at /metrics w/o authentication - to local
+        # clients only (i.e., to metrics_hosts)
+        self.metrics_hosts = conf.get('metrics_hosts', ('127.0.0.1', '::1'))
+        # gunicorn workers' metrics are aggregated from files in metrics_dir
+        # (see Metrics.share)
+        self.metrics_dir = conf.get('metrics_dir')
+        self.app.wsgi_app = self._metrics_app(self.app.wsgi_app)
+
+        @self.app.before_request
+        def set_route():
+            rule = request.url_rule
+            if rule is not None:
+                request.environ[ROUTE] = rule.rule.rstrip('/') or '/'
+
+        @self.app.teardown_request
+        def close_session(exception=None):
+            # requests are served by multiple threads, each w/ a database
+            # session of its own - released after every request (even if
+            # a route returned early)
+            if self.rest_api.db is not None:
+                self.rest_api.db.session_close()
+
+        @self.app.before_request
+        def check_validators():
+            # immutable results (see Rest_API.validators) are revalidated
+            # w/o running their queries
+            g.validators = None
+            if request.method == 'GET':
+                g.validators = self.rest_api.validators(request.path,
+                                                        request.query_string)
+            if g.validators \
+               and request.if_none_match.contains(g.validators[0]):
+                response = Response(status=304)
+                response.set_etag(g.validators[0])
+                return response
+
+        @self.app.after_request
+        def set_headers(response):
+            if request.method != 'GET' or response.status_code != 200:
+                return response
+            if response.is_streamed and request.args.get('format') \
+                                        == self.rest_api.FORMAT_NDJSON:
+                response.mimetype = 'application/x-ndjson'
+            elif request.args.get('format') == self.rest_api.FORMAT_PACKED:
+                response.mimetype = 'application/octet-stream'
+            # strong ETags: for immutable results, derived from the request;
+            # for all others, from the response body (i.e., saving bandwidth
+            # but not the query) - unless streamed
+            validators = getattr(g, 'validators', None)
+            if validators:
+                response.set_etag(validators[0])
+                response.last_modified = validators[1]
+            elif not response.is_streamed:
+                response.add_etag()
+            else:
+                return response
+            return response.make_conditional(request)
 
         @self.app.route('/')
         def root():
@@ -94,6 +257,16 @@ class Rest_Server():
                 return Response(response='no meters found', status=404)
             return Response(response=result, status=200)
 
+        @self.app.route('/projects/<project_id>/usage')
+        @self.app.route('/projects/<project_id>/usage/')
+        #requires_auth
+        def projects_pid_usage(project_id):
+            result = self.rest_api.route_projects_pid_usage(project_id,\
+                                                         request.query_string)
+            if result is None:
+                return Response(response='no usage found', status=404)
+            return Response(response=result, status=200)
+
         @self.app.route('/projects/<project_id>/meters/<meter_id>/records')
         @self.app.route('/projects/<project_id>/meters/<meter_id>/records/')
         #requires_auth
@@ -195,3 +368,19 @@ class Rest_Server():
             if result is None:
                 return Response(response='record not found', status=404)
             return Response(response=result, status=200)
+
+        @self.app.route('/cache')
+        @self.app.route('/cache/')
+        #requires_auth
+        def cache():
+            result = self.rest_api.route_cache(request.query_string)
+            return Response(response=result, status=200)
+
+        @self.app.route('/query', methods=['POST'])
+        @self.app.route('/query/', methods=['POST'])
+        #requires_auth
+        def query():
+            result = self.rest_api.route_query(request.data)
+            if result is None:
+                return Response(response='invalid query', status=400)
+            return Response(response=result, status=200)
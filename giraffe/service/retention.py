@@ -0,0 +1,205 @@
+__author__ = 'fbahr'
+
+"""
+Downsamples and expires meter records.
+
+Raw meter records older than "raw_days" days are compacted into the hourly
+and daily rollup tables, then deleted in batches of "batch_size" records -
+each batch in a transaction of its own, followed by a short pause, s.t. the
+collector is not blocked. Hourly rollups older than "hourly_days" days are
+deleted the same way (0: keep forever); daily rollups are kept forever.
+
+Rollups are maintained by the collector at ingest time, hence compaction
+mostly means checking them: a day's rollups are (re-)built from its raw
+records only if there are none, or if they cover fewer records than there
+are numeric raw records. Raw records are only deleted after their rollups
+have been committed, i.e. an interrupted run is resumed safely. Days that
+end less than "settle" seconds ago (i.e., the collector's flush window plus
+a margin) are neither compacted nor deleted, s.t. rollups are not rebuilt
+while the collector may still be merging records into them.
+
+Usage (example):
+    engine = RetentionEngine(db.connect(...), raw_days=30, hourly_days=365)
+    engine.start()
+    ...
+    engine.stats
+    > {'days': 3, 'deleted': 1200000, 'rate': 8500.0, ...}
+"""
+
+import time
+from datetime import datetime, timedelta
+from threading import Event
+from giraffe.common.task import Task
+from giraffe.service.db import MeterRecord, HourlyRollup, DailyRollup
+
+import logging
+_logger = logging.getLogger('service.retention')
+
+_DT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _window(start, length):
+    return (start.strftime(_DT_FORMAT),
+            (start + length - timedelta(seconds=1)).strftime(_DT_FORMAT))
+
+
+def _before(end):
+    return (None, (end - timedelta(seconds=1)).strftime(_DT_FORMAT))
+
+
+class RetentionEngine(Task):
+
+    def __init__(self, db, callback=None, raw_days=30, hourly_days=0,
+                 batch_size=5000, interval=3600, pause=0.1, settle=3600):
+        """
+        db is expected to be a Db object used by the engine only (sessions
+        must not be shared between threads); callback, if given, is called
+        w/ the engine as its only parameter after every run.
+        """
+        Task.__init__(self, callback)
+        if callback is None:
+            self.callbacks = []
+        self.daemon = True
+        self.db = db
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.settle = settle
+        self.stats = dict(days=0, compacted=0, deleted=0, reclaimed=0,
+                          rate=0.0, reclaim_rate=0.0)
+        self._stopped = Event()
+
+    def run(self):
+        self.isRunning = True
+        while not self.requestStop:
+            try:
+                self.run_once()
+                self.notifyCallback(self)
+            except Exception:
+                _logger.exception('Retention run failed')
+            self._stopped.wait(self.interval)
+        self.isRunning = False
+
+    def stop(self):
+        self.requestStop = True
+        self._stopped.set()
+
+    def run_once(self, now=None):
+        """
+        Compacts and deletes all expired raw records (and hourly rollups),
+        day by day, oldest first.
+        """
+        now = now or datetime.now()
+        today = datetime(now.year, now.month, now.day)
+        one_day = timedelta(days=1)
+        settled = self._settled(now)
+
+        self.db.session_open()
+        try:
+            rows, size = self.db.table_size(MeterRecord)
+            row_size = float(size) / rows if rows else 0.0
+
+            cutoff = min(today - timedelta(days=self.raw_days),
+                         datetime(settled.year, settled.month, settled.day))
+            oldest = self.db.min(MeterRecord, 'timestamp',
+                                 {'timestamp': _before(cutoff)})
+            day = datetime(oldest.year, oldest.month, oldest.day) \
+                  if oldest else cutoff
+            while day < cutoff and not self.requestStop:
+                window = _window(day, one_day)
+                if self._compact(day, window, now):
+                    self.stats['compacted'] += 1
+                deleted, elapsed = self._expire(MeterRecord,
+                                                {'timestamp': window},
+                                                row_size)
+                self.stats['days'] += 1
+                day += one_day
+                _logger.info('Expired %d records of %s in %.1fs (%.0f rows/s, '
+                             '~%.2f MB/s reclaimed); %d days left'
+                             % (deleted, window[0][:10], elapsed,
+                                self.stats['rate'],
+                                self.stats['reclaim_rate'] / 2 ** 20,
+                                (cutoff - day).days))
+
+            if self.hourly_days and not self.requestStop:
+                cutoff = today - timedelta(days=self.hourly_days)
+                deleted, elapsed = self._expire(HourlyRollup,
+                                                {'bucket': _before(cutoff)})
+                _logger.info('Expired %d hourly rollups before %s in %.1fs'
+                             % (deleted, cutoff.strftime('%Y-%m-%d'),
+                                elapsed))
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self.db.session_close()
+
+    def _settled(self, now):
+        """
+        Returns the time before which the collector is done w/ all records.
+        """
+        return now - timedelta(seconds=self.settle)
+
+    def _compact(self, day, window, now=None):
+        """
+        Makes sure the given day's raw records are covered by its rollups;
+        returns True if the rollups had to be (re-)built. Raises a ValueError
+        if the day has not settled yet (see run_once).
+        """
+        if day + timedelta(days=1) > self._settled(now or datetime.now()):
+            raise ValueError('Records of %s may still be collected'
+                             % day.strftime('%Y-%m-%d'))
+        numeric = self.db.count(MeterRecord, {'timestamp': window}) \
+                  - self.db.count(MeterRecord, {'timestamp': window,
+                                                'numeric_value': None})
+        rolled_up = self.db.sum(DailyRollup, 'count',
+                                {'bucket': window[0]}) or 0
+        if rolled_up and rolled_up >= numeric:
+            return False
+
+        _logger.info('Compacting records of %s' % day.strftime('%Y-%m-%d'))
+        for rollup_cls in (HourlyRollup, DailyRollup):
+            self.db.delete_all(rollup_cls, {'bucket': window})
+        for hour in range(24):
+            hour_window = _window(day + timedelta(hours=hour),
+                                  timedelta(hours=1))
+            records = [dict(meter_id=r.meter_id,
+                            host_id=r.host_id,
+                            resource_id=r.resource_id,
+                            project_id=r.project_id,
+                            value=r.value,
+                            timestamp=r.timestamp)
+                       for r in self.db.load(MeterRecord,
+                                             {'timestamp': hour_window})]
+            for rollup_cls in (HourlyRollup, DailyRollup):
+                self.db.merge_rollups(rollup_cls,
+                                      rollup_cls.aggregate(records))
+        self.db.commit()
+        return True
+
+    def _expire(self, cls, args, row_size=0.0):
+        """
+        Deletes all rows of the given class that match args, in batches, and
+        updates the engine's stats; returns the number of rows deleted and
+        the time it took (in seconds).
+        """
+        started = time.time()
+        deleted = 0
+        while not self.requestStop:
+            count = self.db.delete_batch(cls, args, self.batch_size)
+            self.db.commit()
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause)
+
+        elapsed = max(time.time() - started, 0.001)
+        reclaimed = int(deleted * row_size)
+        self.stats['deleted'] += deleted
+        self.stats['reclaimed'] += reclaimed
+        if deleted:
+            self.stats['rate'] = deleted / elapsed
+            self.stats['reclaim_rate'] = reclaimed / elapsed
+        return deleted, elapsed
@@ -0,0 +1,114 @@
+__author__ = 'fbahr'
+
+"""
+Caches Keystone token validations in front of an auth_token middleware.
+
+A request w/ a token that has been validated before is not passed to the
+auth_token middleware (i.e., causes no round trip to Keystone): the
+identity headers the middleware set for the token (X-Identity-Status,
+X-Roles, X-User-Id, ...) are restored instead. Validated tokens are cached
+for at most "ttl" seconds (or until they expire, if earlier); responses to
+invalid tokens (i.e., 401) are cached and replayed for "negative_ttl"
+seconds.
+
+Usage (example):
+    app.wsgi_app = TokenCache(app.wsgi_app,
+                              lambda app: AuthProtocol(app, conf),
+                              max_size=1000, ttl=300, negative_ttl=60)
+"""
+
+import hashlib
+from datetime import datetime
+
+from giraffe.common.cache import Cache
+
+# WSGI environ keys set by the auth_token middleware for a validated token
+IDENTITY_KEYS = ('HTTP_X_IDENTITY_STATUS',
+                 'HTTP_X_TENANT_ID', 'HTTP_X_TENANT_NAME', 'HTTP_X_TENANT',
+                 'HTTP_X_USER_ID', 'HTTP_X_USER_NAME', 'HTTP_X_USER',
+                 'HTTP_X_ROLES', 'HTTP_X_ROLE', 'HTTP_X_SERVICE_CATALOG',
+                 'keystone.token_info')
+_VALIDATION = 'giraffe.token_cache.validation'
+
+
+class TokenCache(object):
+
+    def __init__(self, app, auth_filter, max_size=1000, ttl=300,
+                 negative_ttl=60):
+        """
+        app is the WSGI application to be protected, auth_filter a function
+        returning the auth_token middleware for a given WSGI application.
+        """
+        self.app = app
+        self.auth_app = auth_filter(self._authenticated)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache = Cache(max_size)
+
+    def __call__(self, environ, start_response):
+        token = environ.get('HTTP_X_AUTH_TOKEN')
+        if not token:
+            return self.auth_app(environ, start_response)
+        key = hashlib.sha1(token).hexdigest()
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            identity, response = cached
+            if response is not None:
+                status, headers, body = response
+                start_response(status, headers)
+                return body
+            # ^note: identity headers sent by the client are dropped, as
+            #        by the auth_token middleware
+            for name in IDENTITY_KEYS:
+                environ.pop(name, None)
+            environ.update(identity)
+            return self.app(environ, start_response)
+
+        validation = environ[_VALIDATION] = {}
+
+        def record_response(status, headers, exc_info=None):
+            validation['status'] = status
+            validation['headers'] = headers
+            return start_response(status, headers, exc_info)
+
+        result = self.auth_app(environ, record_response)
+        if 'identity' in validation:
+            identity = validation['identity']
+            valid = identity.get('HTTP_X_IDENTITY_STATUS') != 'Invalid'
+            self.cache.set(key, (identity, None),
+                           ttl=self._ttl(identity) if valid
+                               else self.negative_ttl)
+        elif validation.get('status', '').startswith('401'):
+            body = list(result)
+            self.cache.set(key, (None, (validation['status'],
+                                        validation['headers'], body)),
+                           ttl=self.negative_ttl)
+            result = body
+        return result
+
+    def _authenticated(self, environ, start_response):
+        """
+        The WSGI application called by the auth_token middleware: records
+        the identity headers it set, then calls the protected application.
+        """
+        validation = environ.get(_VALIDATION)
+        if validation is not None:
+            validation['identity'] = dict((name, environ[name])
+                                          for name in IDENTITY_KEYS
+                                          if name in environ)
+        return self.app(environ, start_response)
+
+    def _ttl(self, identity):
+        """
+        Returns the ttl for a validated token, i.e. self.ttl - or the number
+        of seconds until the token expires, if less.
+        """
+        try:
+            expires = identity['keystone.token_info']['access']['token']\
+                              ['expires']
+            expires = datetime.strptime(expires[:19], '%Y-%m-%dT%H:%M:%S')
+        except Exception:
+            return self.ttl
+        delta = expires - datetime.utcnow()
+        return max(0, min(self.ttl, delta.days * 86400 + delta.seconds))
@@ -62,36 +62,28 @@ class IndexView(tables.DataTableView):
         request = self.request
         project_id = self.request.user.tenant_id
 
-        # list of instance identifiers (strings)
-        instances = client_proxy.get_project_instances(request, project_id)
+        # usage per (cumulative) meter, computed by the Giraffe service
+        usage = client_proxy.get_project_usage(request, project_id,
+                                    meters=['inst.cpu.time',
+                                            'inst.disk.io.read.bytes',
+                                            'inst.disk.io.write.bytes',
+                                            'inst.network.io.incoming.bytes',
+                                            'inst.network.io.outgoing.bytes'],
+                                    month=month, year=year)
 
-        cpu = client_proxy.get_instances_records_monthly_sum(request,\
-                               instances=instances, meter_id='inst.cpu.time',\
-                               month=month, year=year)
+        cpu = usage.get('inst.cpu.time')
         # nanoseconds to hours
         cpu = float(cpu) / 3600000000000 if cpu else 0.0
 
-        disk_r = client_proxy.get_instances_records_monthly_sum(request,
-                                                     instances=instances,\
-                                           meter_id='inst.disk.io.read.bytes',\
-                                           month=month, year=year)
-        disk_w = client_proxy.get_instances_records_monthly_sum(request,
-                                                     instances=instances,\
-                                          meter_id='inst.disk.io.write.bytes',\
-                                          month=month, year=year)
+        disk_r = usage.get('inst.disk.io.read.bytes')
+        disk_w = usage.get('inst.disk.io.write.bytes')
         disk = 0.0
         disk += float(disk_r) if disk_r else 0
         disk += float(disk_w) if disk_w else 0
         disk /= 1024 * 1024 * 1024  # bytes to gigabytes
 
-        net_in = client_proxy.get_instances_records_monthly_sum(request,
-                                                       instances=instances,\
-                                    meter_id='inst.network.io.incoming.bytes',\
-                                    month=month, year=year)
-        net_out = client_proxy.get_instances_records_monthly_sum(request,\
-                                                        instances=instances,\
-                                    meter_id='inst.network.io.outgoing.bytes',\
-                                    month=month, year=year)
+        net_in = usage.get('inst.network.io.incoming.bytes')
+        net_out = usage.get('inst.network.io.outgoing.bytes')
         net = 0.0
         net += float(net_in) if net_in else 0
         net += float(net_out) if net_out else 0
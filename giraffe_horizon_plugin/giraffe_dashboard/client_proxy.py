@@ -189,6 +189,24 @@ def get_instances_count(request):
         return None
 
 
+def get_project_usage(request, project_id, meters, month, year):
+    """
+    Returns a dict of meter name/usage-pairs for the given project, month,
+    and (cumulative) meters, as computed by the Giraffe service.
+    """
+    try:
+        year = int(year)
+        month = int(month)
+        days = calendar.monthrange(year, month)[1]
+        params = {'meters': ','.join(meters),
+                  'start_time': '%s-%02d-01_00-00-00' % (year, month),
+                  'end_time': '%s-%02d-%02d_23-59-59' % (year, month, days)}
+        return giraffeclient(request).get_proj_usage(project_id, params)
+    except Exception as e:
+        LOG.exception(e)
+        return {}
+
+
 def get_instances_records_monthly_sum(request, instances, meter_id, month,
                                      year):
     try:
@@ -4,6 +4,7 @@ import sys
 sys.path.insert(0, '/home/fbahr')
 import unittest
 import re
+from datetime import datetime
 from giraffe.common.config import Config
 from giraffe.common.auth import AuthProxy
 from giraffe.client.api import GiraffeClient
@@ -139,6 +140,56 @@ class ClientTestCases(unittest.TestCase):
                                     params={'limit': limit})
         self.assertEqual(len(meter_records), limit)
 
+    def test_get_host_meter_records_as_ndjson(self):
+        limit = 2
+
+        meter_records = self.gc.get_host_meter_records( \
+                                    host='uncinus', \
+                                    meter="host.cpu.load.avg_15m", \
+                                    params={'limit': limit,
+                                            'format': 'ndjson'})
+                                    # ^ generator of dicts
+        meter_records = list(meter_records)
+        self.assertEqual(len(meter_records), limit)
+        self.assertTrue(isinstance(meter_records[0], (dict)))
+
+    def test_get_host_meter_records_as_columns(self):
+        limit = 2
+
+        columns = self.gc.get_host_meter_records( \
+                              host='uncinus', \
+                              meter="host.cpu.load.avg_15m", \
+                              params={'limit': limit, 'format': 'columnar'})
+                              # ^ dict of meta data and parallel arrays
+        self.assertEqual(len(columns['timestamps']), limit)
+        self.assertEqual(len(columns['values']), limit)
+        self.assertEqual(columns, self.gc.get_host_meter_records( \
+                                      host='uncinus', \
+                                      meter="host.cpu.load.avg_15m", \
+                                      params={'limit': limit,
+                                              'format': 'packed'}))
+
+        # timestamps are seconds since the epoch of the records' timestamps
+        meter_records = self.gc.get_host_meter_records( \
+                                    host='uncinus', \
+                                    meter="host.cpu.load.avg_15m", \
+                                    params={'limit': limit})
+        self.assertEqual([r['timestamp'] for r in meter_records],
+                         [datetime.utcfromtimestamp(t)
+                                  .strftime('%Y-%m-%d %H:%M:%S')
+                          for t in columns['timestamps']])
+
+    def test_get_host_meter_records_as_series(self):
+        series = self.gc.get_host_meter_records( \
+                             host='uncinus', \
+                             meter="host.cpu.load.avg_15m", \
+                             params={'interval': '1h', 'stats': 'avg,count'})
+                             # ^ dict of parallel arrays, not paged
+        self.assertTrue(isinstance(series, (dict)))
+        self.assertEqual(series['interval'], 3600)
+        self.assertEqual(len(series['avg']), len(series['timestamps']))
+        self.assertEqual(len(series['count']), len(series['timestamps']))
+
     def test_count_host_meter_records(self):
         len_meter_records = len(self.gc.get_host_meter_records( \
                                             host='uncinus', \
@@ -412,6 +463,38 @@ class ClientTestCases(unittest.TestCase):
         self.assertIsNotNone(proj_meter_records)
         self.assertTrue(isinstance(proj_meter_records, (tuple)))
 
+    def test_batch(self):
+        uuid  = 'd2b24038-9dee-45d3-876f-d736ddd02d84'
+        meter = 'inst.memory.physical'
+
+        count = self.gc.get_inst_meter_records(uuid, meter,
+                                               params={'aggregation': 'count'})
+        results = self.gc.batch([{'entity': 'instance', 'id': uuid,
+                                  'meter': meter, 'aggregation': 'count'},
+                                 {'entity': 'instance', 'id': uuid,
+                                  'meter': meter, 'limit': 1},
+                                 {'entity': 'unknown', 'id': uuid,
+                                  'meter': meter}])
+        self.assertEqual(3, len(results))
+        self.assertEqual(count, results[0])
+        self.assertEqual(1, len(results[1]))
+        self.assertIsNone(results[2])
+
+    def test_revalidate(self):
+        params = {'start_time': '2013-02-13_17-00-00',
+                  'end_time': '2013-02-13_23-59-59',
+                  'aggregation': 'count'}
+
+        count = self.gc.get_host_meter_records(host='uncinus',
+                                               meter='host.cpu.load.avg_15m',
+                                               params=params)
+        hits = self.gc._validators.hits
+        self.assertEqual(count, self.gc.get_host_meter_records(
+                                    host='uncinus',
+                                    meter='host.cpu.load.avg_15m',
+                                    params=params))
+        self.assertEqual(hits + 1, self.gc._validators.hits)
+
     def test_meter_value_type(self):
         uuid   = 'd2b24038-9dee-45d3-876f-d736ddd02d84'
         meters = [('inst.network.io.incoming.packets', long),
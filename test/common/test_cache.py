@@ -0,0 +1,53 @@
+__author__ = 'fbahr'
+
+import time
+import unittest
+
+from giraffe.common.cache import Cache
+
+
+class CacheTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = Cache(max_size=3, ttl=60)
+
+    def test_get_set(self):
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(0, self.cache.get('b', 0))
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_cached_none(self):
+        self.cache.set('a', None)
+        self.assertTrue('a' in self.cache)
+        self.assertEqual(-1, self.cache.get('b', -1))
+        self.assertIsNone(self.cache.get('a', -1))
+
+    def test_lru_eviction(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        self.assertEqual(3, len(self.cache))
+        self.assertFalse('b' in self.cache)
+        self.assertTrue('a' in self.cache)
+
+    def test_ttl(self):
+        self.cache.set('a', 1, ttl=0.01)
+        self.cache.set('b', 2, ttl=None)
+        time.sleep(0.02)
+        self.assertFalse('a' in self.cache)
+        self.assertEqual(2, self.cache.get('b'))
+
+    def test_delete_clear(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.delete('a')
+        self.assertFalse('a' in self.cache)
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
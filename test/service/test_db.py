@@ -1,10 +1,13 @@
 import sys
 
 from datetime import datetime
+import json
 import unittest
 
 import giraffe.service.db as db
-from giraffe.service.db import Host, Meter, MeterRecord
+from giraffe.service.db import Host, Meter, MeterRecord, HourlyRollup
+from giraffe.service.db import DailyRollup
+from giraffe.service.db import Instance, MeterPresence
 
 
 class DbTestCases(unittest.TestCase):
@@ -110,6 +113,7 @@ class DbTestCases(unittest.TestCase):
     def test_to_dict(self):
         d = self.record.to_dict()
         self.assertEqual(d['value'], self.record.value)
+        self.assertFalse('numeric_value' in d)
 
     def test_load_order(self):
         meter = Meter(name='test_load_meter_order',
@@ -126,6 +130,35 @@ class DbTestCases(unittest.TestCase):
         self.assertTrue(True if len(meters) > 1 else False)
         self.assertEqual(True if meters[0].id > meters[1].id else False, True)
 
+    def test_iter_load(self):
+        records = self.db.load(MeterRecord, {'meter_id': self.meter.id},
+                               order='asc', order_attr='id')
+        streamed = self.db.iter_load(MeterRecord, {'meter_id': self.meter.id},
+                                     order='asc', order_attr='id',
+                                     chunk_size=1)
+        self.assertEqual([r.id for r in records], [r.id for r in streamed])
+
+    def test_load_page(self):
+        args = {'meter_id': self.meter.id}
+        records = self.db.load_page(MeterRecord, args, order_attr='timestamp')
+        paged, after = [], None
+        while True:
+            page = self.db.load_page(MeterRecord, args, limit=1,
+                                     order_attr='timestamp', after=after)
+            if not page:
+                break
+            paged += page
+            after = (page[-1].timestamp, page[-1].id)
+        self.assertEqual([r.id for r in records], [r.id for r in paged])
+
+    def test_load_columns(self):
+        args = {'meter_id': self.meter.id}
+        records = self.db.load(MeterRecord, args, order=db.ORDER_DESC,
+                               order_attr='id')
+        rows = self.db.load_columns(MeterRecord, ('id', 'timestamp'), args,
+                                    order=db.ORDER_DESC, order_attr='id')
+        self.assertEqual([(r.id, r.timestamp) for r in records], rows)
+
     def test_count(self):
         meters = self.db.load(Meter)
         meter_count = self.db.count(Meter)
@@ -158,3 +191,179 @@ class DbTestCases(unittest.TestCase):
             value_sum += int(r.value)
         self.assertEqual(value_sum, self.db.sum(MeterRecord, 'value',
                                                 args=args))
+
+    def test_bulk_insert(self):
+        rows = [dict(meter_id=self.meter.id,
+                     host_id=self.host.id,
+                     user_id='unit_test_user_id',
+                     resource_id='unit_test_resource_id',
+                     project_id='uni_test_project_id',
+                     value=str(v),
+                     duration=0,
+                     timestamp=self.timestamp())
+                for v in range(10)]
+        inserted = self.db.bulk_insert(MeterRecord, rows, chunk_size=3)
+        self.assertEqual(inserted, len(rows))
+        args = {'meter_id': self.meter.id}
+        self.assertEqual(len(rows) + 1, self.db.count(MeterRecord, args=args))
+
+    def test_rollup_aggregate(self):
+        records = [dict(meter_id=1, host_id=1, resource_id=None,
+                        project_id=None, value=v,
+                        timestamp=datetime(2013, 1, 1, 12, m))
+                   for (m, v) in ((30, '3'), (10, '1'), (50, '2'), (20, 'x'))]
+        rollups = HourlyRollup.aggregate(records)
+        self.assertEqual(1, len(rollups))
+        rollup = rollups[0]
+        self.assertEqual(datetime(2013, 1, 1, 12), rollup['bucket'])
+        self.assertEqual('', rollup['resource_id'])
+        self.assertEqual((3, 6.0, 1.0, 3.0), (rollup['count'], rollup['sum'],
+                                              rollup['min'], rollup['max']))
+        self.assertEqual((1.0, 2.0), (rollup['first'], rollup['last']))
+
+    def test_dimension_aggregate(self):
+        records = [dict(meter_id=1, host_id=h, user_id='u', resource_id='i',
+                        project_id='p', value='1',
+                        timestamp=datetime(2013, 1, d))
+                   for (d, h) in ((2, 2), (1, 1), (3, 3))]
+        instances = Instance.aggregate(records)
+        self.assertEqual(1, len(instances))
+        instance = instances[0]
+        self.assertEqual((datetime(2013, 1, 1), datetime(2013, 1, 3)),
+                         (instance['first_seen'], instance['last_seen']))
+        self.assertEqual(3, instance['host_id'])
+        presence = MeterPresence.aggregate(records)
+        self.assertEqual(set(['1', '2', '3', 'p', 'u', 'i']),
+                         set(p['entity_id'] for p in presence))
+
+    def test_merge_seen(self):
+        def record(day, project_id):
+            return dict(meter_id=self.meter.id, host_id=self.host.id,
+                        user_id=None, resource_id='test_merge_seen',
+                        project_id=project_id, value='1',
+                        timestamp=datetime(2013, 1, day))
+        self.db.merge_seen(Instance, Instance.aggregate(
+                               [record(2, 'p2'), record(3, None)]))
+        self.db.merge_seen(Instance, Instance.aggregate([record(1, 'p1')]))
+        instance = self.db.load(Instance, {'uuid': 'test_merge_seen'})[0]
+        self.assertEqual((datetime(2013, 1, 1), datetime(2013, 1, 3)),
+                         (instance.first_seen, instance.last_seen))
+        self.assertEqual('p2', instance.project_id)
+
+    def test_record_indexes(self):
+        indexes = dict((i.name, [c.name for c in i.columns])
+                       for i in MeterRecord.__table__.indexes)
+        self.assertEqual(['host_id', 'meter_id', 'meter_timestamp'],
+                         indexes['ix_meter_record_host_meter_ts'])
+        self.assertEqual(['project_id', 'meter_id', 'meter_timestamp'],
+                         indexes['ix_meter_record_project_meter_ts'])
+        self.assertNotIn('ix_meter_record_project_id', indexes)
+
+    def test_to_number(self):
+        self.assertEqual(42.0, db.to_number('42'))
+        self.assertEqual(-0.5, db.to_number('-5e-1'))
+        for value in ('x', '', None, 'nan', 'inf'):
+            self.assertIsNone(db.to_number(value))
+
+    def test_merge_rollups(self):
+        def record(minute, value):
+            return dict(meter_id=self.meter.id, host_id=self.host.id,
+                        resource_id=None, project_id=None, value=value,
+                        timestamp=datetime(2013, 1, 1, 12, minute))
+        # late-arriving records: merged after records with later timestamps
+        self.db.merge_rollups(HourlyRollup, HourlyRollup.aggregate(
+                                  [record(20, '5'), record(30, '7')]))
+        self.db.merge_rollups(HourlyRollup, HourlyRollup.aggregate(
+                                  [record(10, '1'), record(40, '3')]))
+        rollup = self.db.load(HourlyRollup, {'meter_id': self.meter.id},
+                              limit=1)[0]
+        self.assertEqual((4, 16.0, 1.0, 7.0), (rollup.count, rollup.sum,
+                                               rollup.min, rollup.max))
+        self.assertEqual((1.0, 3.0), (rollup.first, rollup.last))
+        avgs = self.db.rollup_avg(HourlyRollup, {'meter_id': self.meter.id})
+        self.assertEqual({datetime(2013, 1, 1, 12): 4.0}, avgs)
+
+    def test_values_json_serializable(self):
+        # DOUBLE columns (and averages of rollups) are floats, not Decimals
+        self.db.merge_rollups(HourlyRollup, HourlyRollup.aggregate(
+            [dict(meter_id=self.meter.id, host_id=self.host.id,
+                  resource_id=None, project_id=None, value='2.5',
+                  timestamp=datetime(2013, 1, 1, 12))]))
+        rollup = self.db.load(HourlyRollup, {'meter_id': self.meter.id},
+                              limit=1)[0]
+        avgs = self.db.rollup_avg(HourlyRollup, {'meter_id': self.meter.id})
+        buckets = self.db.rollup_bucketed(HourlyRollup,
+                                          {'meter_id': self.meter.id},
+                                          bucket_seconds=3600,
+                                          funcs=('avg', 'sum'))
+        self.assertEqual('[2.5, 2.5, [[2.5, 2.5]]]',
+                         json.dumps([rollup.sum, avgs.values()[0],
+                                     buckets.values()]))
+        self.db.bulk_insert(MeterRecord, [dict(meter_id=self.meter.id,
+                                               host_id=self.host.id,
+                                               value='2.5', numeric_value=2.5,
+                                               duration=0,
+                                               timestamp=datetime(2013, 1, 1,
+                                                                  12))])
+        record = self.db.load(MeterRecord, {'meter_id': self.meter.id,
+                                            'value': '2.5'}, limit=1)[0]
+        self.assertTrue(isinstance(record.numeric_value, float))
+
+    def test_bucketed(self):
+        rows = [dict(meter_id=self.meter.id, host_id=self.host.id,
+                     value=str(v), numeric_value=float(v), duration=0,
+                     timestamp=datetime(2013, 1, 1, h, 30))
+                for (h, v) in ((10, 1), (10, 3), (11, 5))]
+        self.db.bulk_insert(MeterRecord, rows)
+        buckets = self.db.bucketed(MeterRecord, 'numeric_value',
+                                   {'meter_id': self.meter.id,
+                                    'timestamp': ('2013-01-01 00:00:00',
+                                                  '2013-01-01 23:59:59')},
+                                   bucket_seconds=3600,
+                                   funcs=('avg', 'count'))
+        self.assertEqual({datetime(2013, 1, 1, 10): (2.0, 2),
+                          datetime(2013, 1, 1, 11): (5.0, 1)}, buckets)
+
+    def test_rollup_bucketed(self):
+        records = [dict(meter_id=self.meter.id, host_id=self.host.id,
+                        resource_id=None, project_id=None, value=str(v),
+                        timestamp=datetime(2013, 1, d, 12))
+                   for (d, v) in ((1, 4), (2, 2), (3, 6))]
+        self.db.merge_rollups(DailyRollup, DailyRollup.aggregate(records))
+        buckets = self.db.rollup_bucketed(DailyRollup,
+                                          {'meter_id': self.meter.id},
+                                          bucket_seconds=2 * 86400,
+                                          funcs=('min', 'count', 'last'))
+        self.assertEqual(2, len(buckets))
+        values = [buckets[b] for b in sorted(buckets)]
+        # buckets of two days, starting at db.BUCKET_ORIGIN: [Dec 31, Jan 1],
+        # [Jan 2, Jan 3]
+        self.assertEqual((4.0, 1), (values[0][0], int(values[0][1])))
+        self.assertEqual((2.0, 2, 6.0), (values[1][0], int(values[1][1]),
+                                         float(values[1][2])))
+
+    def test_first_last(self):
+        rows = [dict(meter_id=self.meter.id, host_id=self.host.id,
+                     resource_id=r, value=str(v), numeric_value=float(v),
+                     duration=0, timestamp=datetime(2013, 1, 1, h))
+                for (r, h, v) in (('a', 12, 5), ('a', 10, 3), ('a', 11, 4),
+                                  ('b', 10, 7))]
+        self.db.bulk_insert(MeterRecord, rows)
+        values = self.db.first_last(MeterRecord, ('resource_id',),
+                                    {'meter_id': self.meter.id,
+                                     'resource_id': ['a', 'b']})
+        self.assertEqual((3.0, 5.0), tuple(map(float, values[('a',)])))
+        self.assertEqual((7.0, 7.0), tuple(map(float, values[('b',)])))
+
+    def test_first_last_large_group(self):
+        # more values than fit into GROUP_CONCAT's default 1024 bytes
+        rows = [dict(meter_id=self.meter.id, host_id=self.host.id,
+                     resource_id='a', value=str(1000000.5 + v),
+                     numeric_value=1000000.5 + v, duration=0,
+                     timestamp=datetime(2013, 1, 1, v / 60, v % 60))
+                for v in range(500)]
+        self.db.bulk_insert(MeterRecord, rows)
+        values = self.db.first_last(MeterRecord, ('resource_id',),
+                                    {'meter_id': self.meter.id,
+                                     'resource_id': 'a'})
+        self.assertEqual((1000000.5, 1000499.5), values[('a',)])
@@ -0,0 +1,111 @@
+__author__ = 'fbahr'
+
+import time
+import unittest
+
+from giraffe.service.instance_resolver import InstanceResolver
+
+
+class FakeServer(object):
+
+    def __init__(self, id, tenant_id, user_id):
+        self.id = id
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+
+
+class FakeNovaClient(object):
+    """
+    Stand-in for novaclient.v1_1.client.Client; counts servers.list() calls.
+    """
+
+    def __init__(self):
+        self.servers = self
+        self.calls = 0
+        self.instances = [FakeServer('inst_%d' % i, 'proj_%d' % (i % 3),
+                                     'user_%d' % i)
+                          for i in range(100)]
+
+    def list(self, detailed=True, search_opts=None):
+        self.calls += 1
+        return list(self.instances)
+
+
+class InstanceResolverTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.nova = FakeNovaClient()
+        self.notified = []
+        self.resolver = InstanceResolver(lambda: self.nova,
+                                         self.notified.append,
+                                         ttl=60, min_interval=0.01)
+
+    def tearDown(self):
+        self.resolver.stop()
+
+    def wait_for(self, condition, timeout=2):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_refresh(self):
+        self.resolver.refresh()
+        self.assertEqual(1, self.nova.calls)
+        self.assertEqual(100, len(self.resolver.known_instances))
+        self.assertEqual(('proj_1', 'user_1'), self.resolver.get('inst_1'))
+        self.assertEqual(('proj_2', 'user_98'), self.resolver.get('inst_98'))
+        self.assertEqual(1, self.nova.calls)
+
+    def test_get_does_not_block(self):
+        self.assertIsNone(self.resolver.get('inst_1'))
+        self.assertFalse(self.resolver.is_unknown('inst_1'))
+        self.assertEqual(0, self.nova.calls)
+
+    def test_unknown(self):
+        self.resolver.get('inst_x')
+        self.resolver.refresh()
+        self.assertTrue(self.resolver.is_unknown('inst_x'))
+        self.assertFalse(self.resolver.is_unknown('inst_1'))
+
+    def test_unknown_kept(self):
+        self.resolver.get('inst_x')
+        self.resolver.refresh()
+        self.resolver.refresh()
+        self.assertTrue(self.resolver.is_unknown('inst_x'))
+        self.assertIsNone(self.resolver.get('inst_x'))
+        self.assertEqual(set(), self.resolver._requested)
+
+        self.nova.instances.append(FakeServer('inst_x', 'p', 'u'))
+        self.resolver.refresh()
+        self.assertFalse(self.resolver.is_unknown('inst_x'))
+        self.assertEqual(('p', 'u'), self.resolver.get('inst_x'))
+
+    def test_unknown_ttl(self):
+        resolver = InstanceResolver(lambda: self.nova, None, unknown_ttl=0.01)
+        resolver.get('inst_x')
+        resolver.refresh()
+        self.assertTrue(resolver.is_unknown('inst_x'))
+        time.sleep(0.02)
+        self.assertFalse(resolver.is_unknown('inst_x'))
+        resolver.get('inst_x')
+        self.assertEqual(set(['inst_x']), resolver._requested)
+
+    def test_batched_misses(self):
+        self.resolver.start()
+        self.assertTrue(self.wait_for(lambda: len(self.notified) == 1))
+
+        for i in range(5):
+            self.nova.instances.append(FakeServer('new_%d' % i, 'p', 'u'))
+        for i in range(5):
+            self.assertIsNone(self.resolver.get('new_%d' % i))
+
+        self.assertTrue(self.wait_for(
+                            lambda: self.resolver.get('new_4') is not None))
+        self.assertTrue(all(self.resolver.get('new_%d' % i)
+                            for i in range(5)))
+        self.assertTrue(self.nova.calls <= 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
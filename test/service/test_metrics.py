@@ -0,0 +1,137 @@
+__author__ = 'fbahr'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from giraffe.service.metrics import Metrics, ROUTE
+
+
+class FakeDb(object):
+    """
+    Stand-in for giraffe.service.db.Db, collecting event listeners.
+    """
+
+    def __init__(self):
+        self.listeners = {}
+
+    def listen(self, identifier, fn):
+        self.listeners[identifier] = fn
+
+    def query(self, rows):
+        conn, cursor = FakeConnection(), FakeCursor(rows)
+        for identifier in ('before_cursor_execute', 'after_cursor_execute'):
+            self.listeners[identifier](conn, cursor, 'SELECT 1', (), None,
+                                       False)
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.info = {}
+
+
+class FakeCursor(object):
+
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+
+
+class MetricsTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDb()
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+        self.metrics.instrument(self.db)
+
+    def test_observe(self):
+        self.metrics.start()
+        self.db.query(rows=3)
+        self.db.query(rows=-1)
+        self.metrics.observe('/hosts', 200, 0.5, 100)
+        self.metrics.start()
+        self.metrics.observe('/hosts', 200, 0.05, 10)
+        self.metrics.start()
+        self.metrics.observe('/hosts', 404, 2.0, None)
+
+        lines = self.metrics.render().splitlines()
+        for line in ('giraffe_api_requests_total{route="/hosts",'
+                     'status="200"} 2',
+                     'giraffe_api_requests_total{route="/hosts",'
+                     'status="404"} 1',
+                     'giraffe_api_request_duration_seconds_bucket'
+                     '{route="/hosts",le="0.1"} 1',
+                     'giraffe_api_request_duration_seconds_bucket'
+                     '{route="/hosts",le="1.0"} 2',
+                     'giraffe_api_request_duration_seconds_bucket'
+                     '{route="/hosts",le="+Inf"} 3',
+                     'giraffe_api_request_duration_seconds_count'
+                     '{route="/hosts"} 3',
+                     'giraffe_api_rows_total{route="/hosts"} 3',
+                     'giraffe_api_response_bytes_total{route="/hosts"} 110'):
+            self.assertTrue(line in lines, line)
+
+    def test_escape(self):
+        self.metrics.start()
+        self.metrics.observe('/a"b', 200, 0.01, 0)
+        self.assertTrue('giraffe_api_requests_total{route="/a\\"b",'
+                        'status="200"} 1' in self.metrics.render())
+
+    def test_middleware(self):
+        def app(environ, start_response):
+            environ[ROUTE] = '/hosts'
+            if environ['PATH_INFO'] == '/fail':
+                raise ValueError('route failed')
+            start_response('404 NOT FOUND', [('Content-Length', '5')])
+            return ['hosts']
+
+        measured_app = self.metrics.middleware(app)
+        self.assertEqual(['hosts'],
+                         measured_app({'PATH_INFO': '/hosts'},
+                                      lambda status, headers, exc_info=None:
+                                          None))
+        self.assertRaises(ValueError, measured_app, {'PATH_INFO': '/fail'},
+                          None)
+
+        lines = self.metrics.render().splitlines()
+        for line in ('giraffe_api_requests_total{route="/hosts",'
+                     'status="404"} 1',
+                     'giraffe_api_requests_total{route="/hosts",'
+                     'status="500"} 1',
+                     'giraffe_api_response_bytes_total{route="/hosts"} 5'):
+            self.assertTrue(line in lines, line)
+
+    def test_share(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.metrics.share(directory)
+        self.metrics.start()
+        self.db.query(rows=3)
+        self.metrics.observe('/hosts', 200, 0.5, 100)
+        # i.e., the metrics of a worker that has exited meanwhile
+        os.rename(os.path.join(directory, '%d.json' % os.getpid()),
+                  os.path.join(directory, '1.json'))
+
+        worker = Metrics(buckets=(0.1, 1.0))
+        worker.directory = directory
+        self.assertTrue('giraffe_api_requests_total{route="/hosts",'
+                        'status="200"} 1' in worker.render())
+        worker.start()
+        worker.observe('/hosts', 200, 0.05, 10)
+
+        lines = self.metrics.render().splitlines()
+        for line in ('giraffe_api_requests_total{route="/hosts",'
+                     'status="200"} 2',
+                     'giraffe_api_request_duration_seconds_bucket'
+                     '{route="/hosts",le="0.1"} 1',
+                     'giraffe_api_rows_total{route="/hosts"} 3',
+                     'giraffe_api_response_bytes_total{route="/hosts"} 110'):
+            self.assertTrue(line in lines, line)
+
+        self.metrics.share(directory)
+        self.assertEqual([], os.listdir(directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+__author__ = 'fbahr'
+
+import unittest
+from datetime import datetime
+
+from giraffe.service.partitions import add_months, period_start, \
+                                       partition_plan
+
+
+class PartitionsTestCases(unittest.TestCase):
+
+    def test_add_months(self):
+        self.assertEqual(datetime(2013, 2, 1),
+                         add_months(datetime(2012, 12, 24, 18), 2))
+        self.assertEqual(datetime(2012, 11, 1),
+                         add_months(datetime(2013, 1, 31), -2))
+
+    def test_period_start(self):
+        self.assertEqual(datetime(2013, 3, 1),
+                         period_start(datetime(2013, 3, 15)))
+        self.assertEqual(datetime(2013, 4, 1),
+                         period_start(datetime(2013, 6, 30), months=3))
+
+    def test_plan_initial(self):
+        create, drop = partition_plan([], datetime(2013, 3, 15), ahead=2,
+                                      oldest=datetime(2013, 1, 5))
+        self.assertEqual(['p201301', 'p201302', 'p201303', 'p201304',
+                          'p201305'], [name for (name, _) in create])
+        self.assertEqual(datetime(2013, 6, 1), create[-1][1])
+        self.assertEqual([], drop)
+
+    def test_plan_existing(self):
+        existing = [('p201301', datetime(2013, 2, 1)),
+                    ('p201302', datetime(2013, 3, 1)),
+                    ('p201303', datetime(2013, 4, 1)),
+                    ('pmax', None)]
+        create, drop = partition_plan(existing, datetime(2013, 3, 15),
+                                      ahead=1, retention=1)
+        self.assertEqual([('p201304', datetime(2013, 5, 1))], create)
+        self.assertEqual(['p201301'], drop)
+
+    def test_plan_up_to_date(self):
+        existing = [('p201303', datetime(2013, 4, 1)), ('pmax', None)]
+        self.assertEqual(([], []), partition_plan(existing,
+                                                  datetime(2013, 3, 1),
+                                                  ahead=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+__author__ = 'fbahr'
+
+import time
+import unittest
+from threading import Event
+
+from giraffe.service.replicas import Replicas
+
+
+class FakeUrl(object):
+
+    def __init__(self, host):
+        self.host = host
+
+
+class FakeEngine(object):
+    """
+    Stand-in for a SQLAlchemy engine answering SHOW SLAVE STATUS w/ the
+    given lag (None: replication stopped), or failing if down is True.
+    """
+
+    def __init__(self, host, lag=0, down=False):
+        self.url = FakeUrl(host)
+        self.lag = lag
+        self.down = down
+        self.checks = 0
+
+    def execute(self, statement):
+        self.checks += 1
+        if self.down:
+            raise Exception('connection refused')
+        return self
+
+    def first(self):
+        return {'Seconds_Behind_Master': self.lag}
+
+
+class HangingEngine(FakeEngine):
+    """
+    A replica that does not answer until released.
+    """
+
+    def __init__(self, host):
+        FakeEngine.__init__(self, host)
+        self.checking = Event()
+        self.released = Event()
+
+    def execute(self, statement):
+        self.checking.set()
+        self.released.wait()
+        return FakeEngine.execute(self, statement)
+
+
+class ReplicasTestCases(unittest.TestCase):
+
+    def replicas(self, engines, **kwargs):
+        # checked once upfront; the background checks are due after an hour
+        replicas = Replicas(engines, check_interval=3600, **kwargs)
+        replicas.check()
+        self.addCleanup(replicas.stop)
+        return replicas
+
+    def test_round_robin(self):
+        engines = [FakeEngine('r1'), FakeEngine('r2')]
+        replicas = self.replicas(engines)
+        picked = [replicas.pick() for _ in range(4)]
+        self.assertEqual(set(engines), set(picked))
+        self.assertNotEqual(picked[0], picked[1])
+
+    def test_unhealthy(self):
+        healthy = FakeEngine('r1')
+        replicas = self.replicas([FakeEngine('r2', lag=120), healthy,
+                                  FakeEngine('r3', lag=None),
+                                  FakeEngine('r4', down=True)], max_lag=30)
+        self.assertEqual([healthy] * 3, [replicas.pick() for _ in range(3)])
+
+    def test_fallback(self):
+        replicas = self.replicas([FakeEngine('r1', down=True)])
+        self.assertIsNone(replicas.pick())
+
+    def test_mark_failed(self):
+        engine = FakeEngine('r1')
+        replicas = self.replicas([engine])
+        replicas.pick()
+        replicas.mark_failed(engine)
+        self.assertIsNone(replicas.pick())
+        self.assertEqual(1, engine.checks)
+
+        replicas.check()
+        self.assertEqual(engine, replicas.pick())
+
+    def test_pick_does_not_block(self):
+        engine = HangingEngine('r1')
+        replicas = Replicas([engine], check_interval=3600)
+        self.addCleanup(replicas.stop)
+        self.addCleanup(engine.released.set)
+        # checked in the background: reads fall back to the primary
+        self.assertIsNone(replicas.pick())
+        self.assertTrue(engine.checking.wait(5))
+        self.assertIsNone(replicas.pick())
+
+        engine.released.set()
+        for _ in range(500):
+            if replicas.pick() is not None:
+                break
+            time.sleep(0.01)
+        self.assertEqual(engine, replicas.pick())
+
+
+if __name__ == '__main__':
+    unittest.main()
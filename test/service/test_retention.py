@@ -0,0 +1,86 @@
+__author__ = 'fbahr'
+
+import unittest
+from datetime import datetime
+
+from giraffe.service.retention import RetentionEngine
+
+
+class FakeDb(object):
+    """
+    Stand-in for giraffe.service.db.Db, w/ a fixed number of (numeric) raw
+    records and rolled up records per day.
+    """
+
+    def __init__(self, records, rolled_up):
+        self.records = records
+        self.rolled_up = rolled_up
+        self.loads = 0
+        self.commits = 0
+
+    def count(self, cls, args={}):
+        return 0 if 'numeric_value' in args else self.records
+
+    def sum(self, cls, column, args={}):
+        return self.rolled_up
+
+    def delete_all(self, cls, args={}):
+        pass
+
+    def load(self, cls, args={}):
+        self.loads += 1
+        return []
+
+    def merge_rollups(self, cls, rollups):
+        pass
+
+    def delete_batch(self, cls, args={}, limit=None):
+        count = min(self.records, limit)
+        self.records -= count
+        return count
+
+    def commit(self):
+        self.commits += 1
+
+
+class RetentionTestCases(unittest.TestCase):
+
+    day = datetime(2013, 1, 1)
+    window = ('2013-01-01 00:00:00', '2013-01-01 23:59:59')
+
+    def test_compact_covered(self):
+        engine = RetentionEngine(FakeDb(records=10, rolled_up=10))
+        self.assertFalse(engine._compact(self.day, self.window))
+        self.assertEqual(0, engine.db.loads)
+
+    def test_compact_missing(self):
+        for rolled_up in (None, 5):
+            engine = RetentionEngine(FakeDb(records=10, rolled_up=rolled_up))
+            self.assertTrue(engine._compact(self.day, self.window))
+            self.assertEqual(24, engine.db.loads)
+
+    def test_compact_unsettled(self):
+        # the collector may still be merging records into the day's rollups
+        engine = RetentionEngine(FakeDb(records=10, rolled_up=5), settle=600)
+        self.assertRaises(ValueError, engine._compact, self.day, self.window,
+                          datetime(2013, 1, 2, 0, 5))
+        self.assertEqual(0, engine.db.loads)
+        self.assertTrue(engine._compact(self.day, self.window,
+                                        datetime(2013, 1, 2, 0, 10)))
+
+    def test_compact_partially_expired(self):
+        # rollups are kept if raw records have been deleted in part already
+        engine = RetentionEngine(FakeDb(records=3, rolled_up=10))
+        self.assertFalse(engine._compact(self.day, self.window))
+
+    def test_expire_batches(self):
+        engine = RetentionEngine(FakeDb(records=25, rolled_up=25),
+                                 batch_size=10, pause=0)
+        deleted, _ = engine._expire(None, {}, row_size=100.0)
+        self.assertEqual(25, deleted)
+        self.assertEqual(3, engine.db.commits)
+        self.assertEqual(2500, engine.stats['reclaimed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
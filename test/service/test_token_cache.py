@@ -0,0 +1,120 @@
+__author__ = 'fbahr'
+
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from giraffe.service.token_cache import TokenCache
+
+
+class FakeAuthProtocol(object):
+    """
+    Stand-in for keystone's auth_token middleware, validating the given
+    tokens (dict of token/roles-pairs) w/o a round trip; other tokens are
+    rejected (401), or passed on as invalid if delay_auth_decision is True.
+    """
+
+    def __init__(self, app, tokens, delay_auth_decision=False, expires=None):
+        self.app = app
+        self.tokens = tokens
+        self.delay_auth_decision = delay_auth_decision
+        self.expires = expires
+        self.validations = 0
+
+    def __call__(self, environ, start_response):
+        self.validations += 1
+        environ.pop('HTTP_X_ROLES', None)
+        token = environ.get('HTTP_X_AUTH_TOKEN')
+        if token in self.tokens:
+            environ['HTTP_X_IDENTITY_STATUS'] = 'Confirmed'
+            environ['HTTP_X_ROLES'] = self.tokens[token]
+            if self.expires:
+                environ['keystone.token_info'] = \
+                    {'access': {'token': {'expires': self.expires}}}
+        elif self.delay_auth_decision:
+            environ['HTTP_X_IDENTITY_STATUS'] = 'Invalid'
+        else:
+            start_response('401 Unauthorized',
+                           [('WWW-Authenticate', 'Keystone uri=fake')])
+            return ['Authentication required']
+        return self.app(environ, start_response)
+
+
+class TokenCacheTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.auth = None
+        self.token_cache = self.create()
+
+    def app(self, environ, start_response):
+        self.requests.append((environ.get('HTTP_X_IDENTITY_STATUS'),
+                              environ.get('HTTP_X_ROLES')))
+        start_response('200 OK', [])
+        return ['ok']
+
+    def create(self, **kwargs):
+        def auth_filter(app):
+            self.auth = FakeAuthProtocol(app, {'t1': 'admin', 't2': 'member'},
+                                         **kwargs)
+            return self.auth
+        return TokenCache(self.app, auth_filter, max_size=10, ttl=60,
+                          negative_ttl=0.01)
+
+    def request(self, token=None, **headers):
+        environ = dict(headers)
+        if token:
+            environ['HTTP_X_AUTH_TOKEN'] = token
+        statuses = []
+        body = self.token_cache(environ,
+                                lambda status, headers, exc_info=None:
+                                    statuses.append(status))
+        return statuses[0], ''.join(body)
+
+    def test_validated(self):
+        for _ in range(3):
+            self.assertEqual(('200 OK', 'ok'), self.request('t1'))
+        self.request('t2')
+        self.assertEqual(2, self.auth.validations)
+        self.assertEqual([('Confirmed', 'admin')] * 3
+                         + [('Confirmed', 'member')], self.requests)
+
+    def test_spoofed_roles(self):
+        self.request('t2')
+        self.request('t2', HTTP_X_ROLES='admin')
+        self.assertEqual([('Confirmed', 'member')] * 2, self.requests)
+
+    def test_invalid(self):
+        for _ in range(2):
+            status, body = self.request('bogus')
+            self.assertEqual('401 Unauthorized', status)
+            self.assertEqual('Authentication required', body)
+        self.assertEqual(1, self.auth.validations)
+        time.sleep(0.02)
+        self.request('bogus')
+        self.assertEqual(2, self.auth.validations)
+        self.assertEqual([], self.requests)
+
+    def test_delay_auth_decision(self):
+        self.token_cache = self.create(delay_auth_decision=True)
+        self.request('bogus')
+        self.request('bogus')
+        self.assertEqual(1, self.auth.validations)
+        self.assertEqual([('Invalid', None)] * 2, self.requests)
+
+    def test_expired(self):
+        expires = datetime.utcnow() - timedelta(seconds=1)
+        self.token_cache = self.create(
+                               expires=expires.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        self.request('t1')
+        self.request('t1')
+        self.assertEqual(2, self.auth.validations)
+
+    def test_no_token(self):
+        self.request()
+        self.request()
+        self.assertEqual(2, self.auth.validations)
+
+
+if __name__ == '__main__':
+    unittest.main()